@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.sql.functions import coalesce
+
+from backend.src.db_core.helper import db_helper
+from backend.src.db_core.tables import BusinessFinance, Order, Product, ProductQuanity
+from backend.src.orders.db import SETTLE_CART_QUERY
+
+# Каждый прогон откатывается, данные в базе не меняются:
+# python -m backend.bench.checkout_settlement --user-id 1 --product-ids 1 2 3 --iterations 50
+
+USER_ID = 1
+
+
+async def legacy_settle_cart(cart: list[int], session) -> None:
+    for id in cart:
+        await session.execute(
+            update(ProductQuanity)
+            .where(ProductQuanity.product_id == id)
+            .values(quanity=coalesce(ProductQuanity.quanity, 0) - 1))
+        result = await session.execute(
+            select(Product)
+            .where(Product.id == id))
+        product = result.scalar()
+        await session.execute(
+            update(BusinessFinance)
+            .values(
+                revenue=coalesce(BusinessFinance.revenue, 0) + product.price,
+                balance=coalesce(BusinessFinance.balance, 0) + (product.price * 0.98),
+                earnings=coalesce(BusinessFinance.earnings, 0) + (product.price * 0.98))
+            .where(BusinessFinance.business_id == product.creator_id))
+
+
+async def settle_cart(cart: list[int], session) -> None:
+    result = await session.execute(
+        insert(Order)
+        .values(creator_id=USER_ID, is_canceled=False, is_deleted=False)
+        .returning(Order.id))
+    order_id = result.scalar()
+    quantities = Counter(cart)
+    prices = await session.execute(
+        select(Product.id, Product.price)
+        .where(Product.id.in_(list(quantities))))
+    prices = dict(prices.all())
+    await session.execute(
+        SETTLE_CART_QUERY,
+        {'product_ids': list(quantities),
+         'quantities': list(quantities.values()),
+         'prices': [prices[id] for id in quantities],
+         'order_id': order_id})
+
+
+async def measure(settler, cart: list[int], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        async with db_helper.session_factory() as session:
+            await settler(cart, session)
+            await session.rollback()
+    return iterations / (time.perf_counter() - started)
+
+
+async def main(product_ids: list[int], iterations: int) -> None:
+    print(f"{'cart size':>10} {'before, carts/s':>16} {'after, carts/s':>15}")
+    for cart_size in (1, 10, 50, 100, 500):
+        cart = [product_ids[i % len(product_ids)] for i in range(cart_size)]
+        before = await measure(legacy_settle_cart, cart, iterations)
+        after = await measure(settle_cart, cart, iterations)
+        print(f"{cart_size:>10} {before:>16.1f} {after:>15.1f}")
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--product-ids", type=int, nargs="+", default=[1])
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    USER_ID = args.user_id
+    asyncio.run(main(args.product_ids, args.iterations))
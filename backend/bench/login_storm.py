@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from httpx import AsyncClient
+
+# Запуск при поднятом сервере: python -m backend.bench.login_storm --base-url http://127.0.0.1:8000
+# Сравнивает задержку /ping без нагрузки и во время потока входов.
+# Чтобы нагрузить именно хэширование, сервер запускается с AUTH_RATE_LIMIT_ENABLED=false,
+# иначе большая часть входов с одного IP получит 429
+
+
+def summary(name: str, latencies: list) -> str:
+    latencies = sorted(latencies)
+    return (
+        f"{name:>12}: n={len(latencies)} "
+        f"p50={statistics.median(latencies):.2f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:.2f}ms "
+        f"max={latencies[-1]:.2f}ms")
+
+
+async def sample_ping(client: AsyncClient, base_url: str, stop: asyncio.Event, interval: float) -> list:
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(f"{base_url}/ping")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def login_storm(client: AsyncClient, base_url: str, creds: dict, logins: int, concurrency: int) -> dict:
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login() -> None:
+        async with semaphore:
+            response = await client.post(f"{base_url}/v1/api/auth/user/sign-in", json=creds)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return statuses
+
+
+async def main(base_url: str, logins: int, concurrency: int, baseline: float, interval: float) -> None:
+    creds = {'email': f'{uuid.uuid4().hex[:20]}@storm.com', 'password': 'Storm-Passw0rd'}
+    async with AsyncClient(timeout=60) as client:
+        response = await client.post(f"{base_url}/v1/api/auth/user/sign-up", json=creds)
+        response.raise_for_status()
+
+        stop = asyncio.Event()
+        pinger = asyncio.create_task(sample_ping(client, base_url, stop, interval))
+        await asyncio.sleep(baseline)
+        stop.set()
+        idle = await pinger
+
+        stop = asyncio.Event()
+        pinger = asyncio.create_task(sample_ping(client, base_url, stop, interval))
+        started = time.perf_counter()
+        statuses = await login_storm(client, base_url, creds, logins, concurrency)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        loaded = await pinger
+
+        metrics = (await client.get(f"{base_url}/metrics")).json()
+
+    print(summary("ping idle", idle))
+    print(summary("ping storm", loaded))
+    print(f"{'sign-ins':>12}: {logins} in {elapsed:.2f}s ({logins / elapsed:.1f}/s) statuses={statuses}")
+    print(f"{'hashing':>12}: {metrics.get('hashing')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--baseline", type=float, default=3.0)
+    parser.add_argument("--interval", type=float, default=0.01)
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.logins, args.concurrency, args.baseline, args.interval))
@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import datetime
+import statistics
+import time
+
+from sqlalchemy import insert
+
+from backend.src.db_core.helper import db_helper
+from backend.src.db_core.tables import Product, ProductData, ProductDate, ProductQuanity
+from backend.src.products.db import BusinessDB, _product_dates
+from backend.src.products.models import BusinessUploadProductScheme
+
+# Создаёт реальные товары, запускать только на тестовой базе:
+# python -m backend.bench.product_creation --business-id 1 --iterations 200
+
+
+async def legacy_create_product(creds: BusinessUploadProductScheme, business_id: int, session) -> None:
+    result = await session.execute(
+        insert(Product)
+        .values(price=creds.price, name=creds.name,
+                category_id=creds.category_id,
+                creator_id=business_id,
+                is_deleted=False)
+        .returning(Product.id))
+    await session.commit()
+    product_id = result.scalar()
+    start_date, end_date = _product_dates(creds)
+    session.add_all([
+        ProductQuanity(product_id=product_id, quanity=creds.quanity),
+        ProductDate(product_id=product_id, start_date=start_date, end_date=end_date),
+        ProductData(product_id=product_id, description=creds.description,
+                    sex=creds.sex, adult_only=creds.adult_only)])
+    await session.commit()
+
+
+async def measure(name: str, creator, business_id: int, iterations: int) -> None:
+    creds = BusinessUploadProductScheme(
+        name='Benchmark product',
+        description='Created by backend.bench.product_creation',
+        category_id=1,
+        price=100,
+        sex='u',
+        adult_only=False,
+        start_date=datetime.date.today(),
+        quanity=10)
+    latencies = []
+    async with db_helper.session_factory() as session:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await creator(creds, business_id, session)
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(
+        f"{name:>8}: p50={statistics.median(latencies):.2f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:.2f}ms")
+
+
+async def main(business_id: int, iterations: int) -> None:
+    await measure("before", legacy_create_product, business_id, iterations)
+    await measure("after", BusinessDB.create_product, business_id, iterations)
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--business-id", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.business_id, args.iterations))
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import event, select
+
+from backend.src.db_core.helper import db_helper
+from backend.src.db_core.tables import Product, ProductData, ProductDate, ProductQuanity
+from backend.src.products.cache import product_cache
+from backend.src.products.db import BusinessDB
+
+# Запуск: python -m backend.bench.product_hydration --product-id 1 --iterations 500
+
+round_trips = 0
+
+
+def count_round_trip(*args, **kwargs) -> None:
+    global round_trips
+    round_trips += 1
+
+
+async def legacy_get_product(id: int, session) -> None:
+    await session.execute(select(Product).where(Product.id == id))
+    await session.execute(select(ProductData).where(ProductData.product_id == id))
+    await session.execute(select(ProductDate).where(ProductDate.product_id == id))
+    await session.execute(select(ProductQuanity).where(ProductQuanity.product_id == id))
+
+
+async def uncached_get_product(id: int, session) -> None:
+    # Без сброса кэша замер показывал бы попадания в product_cache, а не один запрос
+    product_cache.invalidate([id])
+    await BusinessDB.get_product(id, session)
+
+
+async def measure(name: str, loader, product_id: int, iterations: int) -> None:
+    global round_trips
+    latencies = []
+    round_trips = 0
+    async with db_helper.session_factory() as session:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await loader(product_id, session)
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(
+        f"{name:>8}: round trips/call={round_trips / iterations:.1f} "
+        f"p50={statistics.median(latencies):.2f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:.2f}ms")
+
+
+async def main(product_id: int, iterations: int) -> None:
+    event.listen(db_helper.engine.sync_engine, "before_cursor_execute", count_round_trip)
+    await measure("before", legacy_get_product, product_id, iterations)
+    await measure("after", uncached_get_product, product_id, iterations)
+    await measure("cached", BusinessDB.get_product, product_id, iterations)
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--product-id", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.product_id, args.iterations))
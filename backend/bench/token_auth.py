@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+from backend.src.auth.cache import token_cache
+from backend.src.auth.utils import JWTAuth
+from backend.src.global_dependencies import get_payload_by_access_token
+
+# Запуск: python -m backend.bench.token_auth --iterations 20000
+# Время проверки access-токена на запрос с кэшем и без (сервер и база не нужны)
+
+
+async def measure(name: str, token: str, iterations: int) -> None:
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await get_payload_by_access_token(access_token=token)
+        latencies.append((time.perf_counter() - started) * 1_000_000)
+    latencies.sort()
+    print(
+        f"{name:>10}: p50={statistics.median(latencies):.1f}us "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:.1f}us "
+        f"total={sum(latencies) / 1000:.1f}ms")
+
+
+async def main(iterations: int, max_size: int) -> None:
+    token = await JWTAuth.create_access(user_id='1', token_for='user')
+    token_cache.max_size = 0
+    await measure("cache off", token, iterations)
+    token_cache.max_size = max_size
+    token_cache.clear()
+    await measure("cache on", token, iterations)
+    print(f"{'stats':>10}: {token_cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--max-size", type=int, default=10000)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations, args.max_size))
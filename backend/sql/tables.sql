@@ -39,10 +39,12 @@ CREATE TABLE IF NOT EXISTS "categories"
 
 CREATE TABLE IF NOT EXISTS "orders"
 (
-    "id"           bigserial NOT NULL UNIQUE,
-    "creator_id"   bigint    NOT NULL,
-    "is_canceled"  boolean   NOT NULL,
-    "is_deleted"   boolean   NOT NULL,
+    "id"            bigserial   NOT NULL UNIQUE,
+    "creator_id"    bigint      NOT NULL,
+    "is_canceled"   boolean     NOT NULL,
+    "is_deleted"    boolean     NOT NULL,
+    "status"        varchar(30) NOT NULL DEFAULT 'created',
+    "status_detail" jsonb,
     PRIMARY KEY ("id")
 );
 
@@ -62,6 +64,34 @@ CREATE TABLE IF NOT EXISTS "users_cart"
     PRIMARY KEY ("user_id")
 );
 
+CREATE TABLE IF NOT EXISTS "cart_items"
+(
+    "user_id"    bigint  NOT NULL,
+    "product_id" bigint  NOT NULL,
+    "quantity"   integer NOT NULL CHECK ("quantity" > 0),
+    PRIMARY KEY ("user_id", "product_id")
+);
+
+-- Последний записанный в cart_items seq отложенного буфера корзин для каждого процесса
+CREATE TABLE IF NOT EXISTS "cart_buffer_checkpoints"
+(
+    "node_id" varchar(50) NOT NULL,
+    "seq"     bigint      NOT NULL,
+    PRIMARY KEY ("node_id")
+);
+
+-- Ключи Idempotency-Key: status_code IS NULL - запрос ещё выполняется
+CREATE TABLE IF NOT EXISTS "idempotency_keys"
+(
+    "user_id"     bigint       NOT NULL,
+    "scope"       varchar(255) NOT NULL,
+    "key"         varchar(255) NOT NULL,
+    "status_code" smallint,
+    "response"    jsonb,
+    "created_at"  timestamp    NOT NULL DEFAULT now(),
+    PRIMARY KEY ("user_id", "scope", "key")
+);
+
 CREATE TABLE IF NOT EXISTS "users_balance"
 (
     "user_id" bigserial NOT NULL UNIQUE,
@@ -78,6 +108,30 @@ CREATE TABLE IF NOT EXISTS "business_finances"
     PRIMARY KEY ("business_id")
 );
 
+-- Журнал начислений продавцам в копейках: только вставки, без обновления горячей строки
+CREATE TABLE IF NOT EXISTS "business_ledger"
+(
+    "id"             bigserial NOT NULL,
+    "business_id"    bigint    NOT NULL,
+    "order_id"       bigint    NOT NULL,
+    "revenue_cents"  bigint    NOT NULL,
+    "balance_cents"  bigint    NOT NULL,
+    "earnings_cents" bigint    NOT NULL,
+    "created_at"     timestamp NOT NULL DEFAULT now(),
+    "rolled_up"      boolean   NOT NULL DEFAULT false,
+    PRIMARY KEY ("id")
+);
+
+-- Свёрнутые итоги журнала, пополняются фоновой задачей
+CREATE TABLE IF NOT EXISTS "business_finance_rollups"
+(
+    "business_id"    bigint NOT NULL,
+    "revenue_cents"  bigint NOT NULL DEFAULT 0,
+    "balance_cents"  bigint NOT NULL DEFAULT 0,
+    "earnings_cents" bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY ("business_id")
+);
+
 CREATE TABLE IF NOT EXISTS "business_profile"
 (
     "business_id" bigserial NOT NULL UNIQUE,
@@ -136,6 +190,16 @@ CREATE TABLE IF NOT EXISTS "order_cart"
     PRIMARY KEY ("order_id")
 );
 
+CREATE TABLE IF NOT EXISTS "order_items"
+(
+    "order_id"   bigint  NOT NULL,
+    "product_id" bigint  NOT NULL,
+    "creator_id" bigint  NOT NULL,
+    "qty"        integer NOT NULL,
+    "unit_price" bigint  NOT NULL,
+    PRIMARY KEY ("order_id", "product_id")
+);
+
 
 
 ALTER TABLE "products"
@@ -148,10 +212,20 @@ ALTER TABLE "users_profile"
     ADD CONSTRAINT "users_profile_fk0" FOREIGN KEY ("user_id") REFERENCES "users" ("id");
 ALTER TABLE "users_cart"
     ADD CONSTRAINT "users_cart_fk0" FOREIGN KEY ("user_id") REFERENCES "users" ("id");
+ALTER TABLE "cart_items"
+    ADD CONSTRAINT "cart_items_fk0" FOREIGN KEY ("user_id") REFERENCES "users_cart" ("user_id");
+ALTER TABLE "cart_items"
+    ADD CONSTRAINT "cart_items_fk1" FOREIGN KEY ("product_id") REFERENCES "products" ("id");
 ALTER TABLE "users_balance"
     ADD CONSTRAINT "users_balance_fk0" FOREIGN KEY ("user_id") REFERENCES "users" ("id");
 ALTER TABLE "business_finances"
     ADD CONSTRAINT "business_finances_fk0" FOREIGN KEY ("business_id") REFERENCES "businesses" ("id");
+ALTER TABLE "business_ledger"
+    ADD CONSTRAINT "business_ledger_fk0" FOREIGN KEY ("business_id") REFERENCES "businesses" ("id");
+ALTER TABLE "business_ledger"
+    ADD CONSTRAINT "business_ledger_fk1" FOREIGN KEY ("order_id") REFERENCES "orders" ("id");
+ALTER TABLE "business_finance_rollups"
+    ADD CONSTRAINT "business_finance_rollups_fk0" FOREIGN KEY ("business_id") REFERENCES "businesses" ("id");
 ALTER TABLE "business_profile"
     ADD CONSTRAINT "business_profile_fk0" FOREIGN KEY ("business_id") REFERENCES "businesses" ("id");
 ALTER TABLE "product_data"
@@ -166,6 +240,190 @@ ALTER TABLE "order_price"
     ADD CONSTRAINT "order_price_fk0" FOREIGN KEY ("order_id") REFERENCES "orders" ("id");
 ALTER TABLE "order_cart"
     ADD CONSTRAINT "order_cart_fk0" FOREIGN KEY ("order_id") REFERENCES "orders" ("id");
+ALTER TABLE "order_items"
+    ADD CONSTRAINT "order_items_fk0" FOREIGN KEY ("order_id") REFERENCES "orders" ("id");
+ALTER TABLE "order_items"
+    ADD CONSTRAINT "order_items_fk1" FOREIGN KEY ("product_id") REFERENCES "products" ("id");
+
+CREATE INDEX IF NOT EXISTS "order_items_creator_id_idx"
+    ON "order_items" ("creator_id", "order_id");
+
+-- Статус заказа для асинхронного оформления: pending - ждёт воркера
+ALTER TABLE "orders"
+    ADD COLUMN IF NOT EXISTS "status" varchar(30) NOT NULL DEFAULT 'created';
+ALTER TABLE "orders"
+    ADD COLUMN IF NOT EXISTS "status_detail" jsonb;
+
+CREATE INDEX IF NOT EXISTS "orders_creator_id_idx"
+    ON "orders" ("creator_id", "id");
+
+CREATE INDEX IF NOT EXISTS "orders_pending_idx"
+    ON "orders" ("id")
+    WHERE "status" = 'pending';
+
+-- Несвёрнутые записи: для чтения баланса продавца и для фоновой свёртки
+CREATE INDEX IF NOT EXISTS "business_ledger_unrolled_idx"
+    ON "business_ledger" ("business_id")
+    WHERE NOT "rolled_up";
+CREATE INDEX IF NOT EXISTS "business_ledger_rollup_queue_idx"
+    ON "business_ledger" ("id")
+    WHERE NOT "rolled_up";
+
+-- Перенос накопленных float8-итогов business_finances в свёртку (в копейках)
+INSERT INTO business_finance_rollups (business_id, revenue_cents, balance_cents, earnings_cents)
+SELECT business_id,
+       round(coalesce(revenue, 0) * 100),
+       round(coalesce(balance, 0) * 100),
+       round(coalesce(earnings, 0) * 100)
+FROM business_finances
+ON CONFLICT DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS "idempotency_keys_created_at_idx"
+    ON "idempotency_keys" ("created_at");
+
+-- Перенос корзин из массива users_cart.shopping_cart в cart_items
+INSERT INTO cart_items (user_id, product_id, quantity)
+SELECT uc.user_id, p.id, count(*)
+FROM users_cart uc
+         CROSS JOIN unnest(uc.shopping_cart) AS item(product_id)
+         JOIN products p ON p.id = item.product_id
+GROUP BY uc.user_id, p.id
+ON CONFLICT DO NOTHING;
+UPDATE users_cart
+SET shopping_cart = '{}'
+WHERE shopping_cart <> '{}';
+
+-- Перенос уже оформленных заказов из order_cart (цена берётся текущая)
+INSERT INTO order_items (order_id, product_id, creator_id, qty, unit_price)
+SELECT oc.order_id, p.id, p.creator_id, count(*), p.price
+FROM order_cart oc
+         CROSS JOIN unnest(oc.shopping_cart) AS item(product_id)
+         JOIN products p ON p.id = item.product_id
+GROUP BY oc.order_id, p.id, p.creator_id, p.price
+ON CONFLICT DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS "sellable_products"
+(
+    "product_id"  bigint       NOT NULL UNIQUE,
+    "name"        varchar(50)  NOT NULL,
+    "price"       bigint       NOT NULL,
+    "category_id" smallint     NOT NULL,
+    "creator_id"  bigint       NOT NULL,
+    "description" varchar(500) NOT NULL,
+    "logo_path"   varchar(255),
+    "sex"         varchar(15)  NOT NULL,
+    "adult_only"  boolean      NOT NULL,
+    "start_date"  timestamp    NOT NULL,
+    "end_date"    timestamp,
+    "quanity"     bigint       NOT NULL,
+    PRIMARY KEY ("product_id")
+);
+
+-- Пересчитывает строку sellable_products для одного товара:
+-- товар попадает в таблицу, только если он не удалён, не истёк и есть в наличии
+CREATE OR REPLACE FUNCTION sync_sellable_product(target_id bigint) RETURNS void AS
+$$
+BEGIN
+    INSERT INTO sellable_products (product_id, name, price, category_id, creator_id, description,
+                                   logo_path, sex, adult_only, start_date, end_date, quanity)
+    SELECT p.id, p.name, p.price, p.category_id, p.creator_id, pd.description,
+           pd.logo_path, pd.sex, pd.adult_only, d.start_date, d.end_date, q.quanity
+    FROM products p
+             JOIN product_data pd ON pd.product_id = p.id
+             JOIN product_date d ON d.product_id = p.id
+             JOIN product_quanity q ON q.product_id = p.id
+    WHERE p.id = target_id
+      AND p.is_deleted = false
+      AND coalesce(q.quanity, 0) > 0
+      AND (d.end_date IS NULL OR (d.end_date > LOCALTIMESTAMP AND d.start_date <= d.end_date))
+    ON CONFLICT (product_id) DO UPDATE
+        SET name        = excluded.name,
+            price       = excluded.price,
+            category_id = excluded.category_id,
+            creator_id  = excluded.creator_id,
+            description = excluded.description,
+            logo_path   = excluded.logo_path,
+            sex         = excluded.sex,
+            adult_only  = excluded.adult_only,
+            start_date  = excluded.start_date,
+            end_date    = excluded.end_date,
+            quanity     = excluded.quanity;
+    IF NOT FOUND THEN
+        DELETE FROM sellable_products WHERE product_id = target_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sellable_products_on_product() RETURNS trigger AS
+$$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM sync_sellable_product(OLD.id);
+    ELSE
+        PERFORM sync_sellable_product(NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sellable_products_on_product_part() RETURNS trigger AS
+$$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM sync_sellable_product(OLD.product_id);
+    ELSE
+        PERFORM sync_sellable_product(NEW.product_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER "products_sellable_sync"
+    AFTER INSERT OR UPDATE OR DELETE ON "products"
+    FOR EACH ROW EXECUTE FUNCTION sellable_products_on_product();
+CREATE OR REPLACE TRIGGER "product_data_sellable_sync"
+    AFTER INSERT OR UPDATE OR DELETE ON "product_data"
+    FOR EACH ROW EXECUTE FUNCTION sellable_products_on_product_part();
+CREATE OR REPLACE TRIGGER "product_date_sellable_sync"
+    AFTER INSERT OR UPDATE OR DELETE ON "product_date"
+    FOR EACH ROW EXECUTE FUNCTION sellable_products_on_product_part();
+CREATE OR REPLACE TRIGGER "product_quanity_sellable_sync"
+    AFTER INSERT OR UPDATE OR DELETE ON "product_quanity"
+    FOR EACH ROW EXECUTE FUNCTION sellable_products_on_product_part();
+
+SELECT sync_sellable_product(id)
+FROM products;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Поиск читает sellable_products, триграммный индекс на products только замедлял запись
+DROP INDEX IF EXISTS "products_name_trgm_idx";
+
+-- Списки товаров продавца читают sellable_products по sellable_products_creator_id_idx
+DROP INDEX IF EXISTS "products_creator_id_idx";
+
+CREATE INDEX IF NOT EXISTS "sellable_products_name_trgm_idx"
+    ON "sellable_products" USING gin ("name" gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS "sellable_products_creator_id_idx"
+    ON "sellable_products" ("creator_id", "product_id");
+
+CREATE INDEX IF NOT EXISTS "sellable_products_category_price_idx"
+    ON "sellable_products" ("category_id", "price", "product_id");
+
+CREATE INDEX IF NOT EXISTS "sellable_products_category_id_idx"
+    ON "sellable_products" ("category_id", "product_id");
+
+CREATE INDEX IF NOT EXISTS "sellable_products_price_idx"
+    ON "sellable_products" ("price", "product_id");
+
+CREATE INDEX IF NOT EXISTS "sellable_products_family_price_idx"
+    ON "sellable_products" ("price", "product_id")
+    WHERE "adult_only" = false;
+
+CREATE INDEX IF NOT EXISTS "sellable_products_end_date_idx"
+    ON "sellable_products" ("end_date")
+    WHERE "end_date" IS NOT NULL;
 
 INSERT INTO categories (id, name, description, is_deleted)
 VALUES (1, 'all', 'All goods!', False)
\ No newline at end of file
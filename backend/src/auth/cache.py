@@ -0,0 +1,68 @@
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any
+
+from backend.src.global_config import settings
+
+
+class TokenCache:
+    # Проверенные access-токены: ключ - sha256 токена, сам токен в памяти не хранится.
+    # Запись живёт до exp токена. Все операции синхронные, без await внутри,
+    # поэтому параллельные запросы в event loop не видят кэш в промежуточном состоянии
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._payloads: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Any | None:
+        if self.max_size <= 0:
+            return None
+        digest = self._digest(token)
+        entry = self._payloads.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, payload = entry
+        if time.time() >= expires_at:
+            del self._payloads[digest]
+            self.misses += 1
+            return None
+        self._payloads.move_to_end(digest)
+        self.hits += 1
+        return payload
+
+    def put(self, token: str, payload: Any, exp: datetime | float | None) -> None:
+        if self.max_size <= 0 or exp is None:
+            return
+        expires_at = exp.timestamp() if isinstance(exp, datetime) else float(exp)
+        digest = self._digest(token)
+        self._payloads[digest] = (expires_at, payload)
+        self._payloads.move_to_end(digest)
+        while len(self._payloads) > self.max_size:
+            self._payloads.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._payloads.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._payloads),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+token_cache = TokenCache(
+    max_size=settings.cache.TOKEN_MAX_SIZE if settings.cache.TOKEN_CACHE_ENABLED else 0)
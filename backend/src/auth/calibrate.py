@@ -0,0 +1,58 @@
+import argparse
+import os
+import statistics
+import time
+
+from argon2 import PasswordHasher
+
+# Подбор параметров Argon2 под целевую задержку проверки пароля на этой машине:
+# python -m backend.src.auth.calibrate --target-ms 100
+# Сначала растёт память (основная защита от перебора на GPU), затем число проходов.
+# Настройки приложения не импортируются, чтобы команда работала без .env
+
+PASSWORD = 'Calibrate-Passw0rd'
+
+
+def measure(time_cost: int, memory_cost: int, parallelism: int, samples: int) -> float:
+    ph = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    hashed = ph.hash(PASSWORD)
+    latencies = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        ph.verify(hashed, PASSWORD)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies)
+
+
+def calibrate(target_ms: float, parallelism: int, min_memory: int, max_memory: int,
+              max_time_cost: int, samples: int) -> tuple:
+    time_cost, memory_cost = 1, min_memory
+    latency = measure(time_cost, memory_cost, parallelism, samples)
+    print(f"time_cost={time_cost} memory_cost={memory_cost} -> {latency:.1f}ms")
+    while latency < target_ms and memory_cost * 2 <= max_memory:
+        memory_cost *= 2
+        latency = measure(time_cost, memory_cost, parallelism, samples)
+        print(f"time_cost={time_cost} memory_cost={memory_cost} -> {latency:.1f}ms")
+    while latency < target_ms and time_cost < max_time_cost:
+        time_cost += 1
+        latency = measure(time_cost, memory_cost, parallelism, samples)
+        print(f"time_cost={time_cost} memory_cost={memory_cost} -> {latency:.1f}ms")
+    return time_cost, memory_cost, latency
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target-ms", type=float, default=100)
+    parser.add_argument("--parallelism", type=int, default=min(os.cpu_count() or 1, 4))
+    parser.add_argument("--min-memory", type=int, default=19456, help="KiB")
+    parser.add_argument("--max-memory", type=int, default=262144, help="KiB")
+    parser.add_argument("--max-time-cost", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+    time_cost, memory_cost, latency = calibrate(
+        args.target_ms, args.parallelism, args.min_memory, args.max_memory,
+        args.max_time_cost, args.samples)
+    print(f"\nverify ~{latency:.1f}ms, add to .env:")
+    print(f"ARGON2_TIME_COST={time_cost}")
+    print(f"ARGON2_MEMORY_COST={memory_cost}")
+    print(f"ARGON2_PARALLELISM={args.parallelism}")
@@ -1,87 +1,127 @@
+import asyncio
 from datetime import datetime
 
 from loguru import logger
-from sqlalchemy import select, insert
+from sqlalchemy import select, update, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.src.auth.models import SignUpScheme, SignInScheme
-from backend.src.auth.utils import HashSecurity
-from backend.src.db_core.tables import (User, UsersBalance, UsersCart, UsersProfile,
-                                        Business, BusinessFinance, BusinessProfile)
+from backend.src.auth.utils import HashSecurity, HashPoolBusy
+from backend.src.db_core.helper import db_helper
+from backend.src.db_core.tables import User, Business
+
+# Регистрация одним выражением и одной транзакцией: аккаунт и все его строки.
+# Повтор email отсекает уникальный индекс, отдельная проверка перед вставкой не нужна
+REGISTER_BUSINESS_QUERY = text("""
+    WITH account AS (
+        INSERT INTO businesses (email, hashed_password, is_deleted)
+        VALUES (:email, :hashed_password, false)
+        RETURNING id
+    ), finances AS (
+        INSERT INTO business_finances (business_id, balance, revenue, earnings)
+        SELECT id, 0, 0, 0
+        FROM account
+    ), profile AS (
+        INSERT INTO business_profile (business_id, title, description, location, date_joined)
+        SELECT id, '', '', 'Чайковский', CAST(:now AS timestamp)
+        FROM account
+    )
+    SELECT id FROM account
+""")
+
+REGISTER_USER_QUERY = text("""
+    WITH account AS (
+        INSERT INTO users (email, hashed_password, role, is_deleted)
+        VALUES (:email, :hashed_password, 'user', false)
+        RETURNING id
+    ), balance AS (
+        INSERT INTO users_balance (user_id, balance)
+        SELECT id, 0
+        FROM account
+    ), cart AS (
+        INSERT INTO users_cart (user_id)
+        SELECT id
+        FROM account
+    ), profile AS (
+        INSERT INTO users_profile (user_id, last_login, date_joined, location)
+        SELECT id, CAST(:now AS timestamp), CAST(:now AS timestamp), 'Чайковский'
+        FROM account
+    )
+    SELECT id FROM account
+""")
+
+# Ссылки на фоновые перехэширования, чтобы задачи не собрал сборщик мусора
+_rehash_tasks = set()
+
+
+@logger.catch
+async def _rehash_password(table, email: str, password: str, old_hash: str) -> None:
+    try:
+        new_hash = await HashSecurity.get_hash(password)
+    except HashPoolBusy:
+        # Пул занят входами - пароль перехэшируется при следующем входе
+        return
+    if not new_hash:
+        return
+    async with db_helper.session_factory() as session:
+        # Хэш меняется, только если его не успели заменить параллельно
+        await session.execute(
+            update(table)
+            .where(table.email == email,
+                   table.hashed_password == old_hash)
+            .values(hashed_password=new_hash))
+        await session.commit()
 
 
-class BusinessDB:
+async def _verify_and_upgrade(table, creds: SignInScheme, hashed_password: str | None) -> bool:
+    if not hashed_password:
+        return False
+    verified = await HashSecurity.verify_hash(message=creds.password, hashed_message=hashed_password)
+    if verified and await HashSecurity.needs_rehash(hashed_password):
+        task = asyncio.create_task(
+            _rehash_password(table, creds.email, creds.password, hashed_password))
+        _rehash_tasks.add(task)
+        task.add_done_callback(_rehash_tasks.discard)
+    return verified
 
-    @staticmethod
-    @logger.catch
-    async def check_exists(
-            session: AsyncSession,
-            creds: SignUpScheme
-    ) -> bool:
-        result = await session.execute(
-            select(Business)
-            .where(Business.email == creds.email))
-        if result.scalar():
-            return False
-        return True
+
+class BusinessDB:
 
     @staticmethod
-    @logger.catch
+    @logger.catch(exclude=HashPoolBusy)
     async def register(
             session: AsyncSession,
             creds: SignUpScheme
-    ) -> str:
+    ) -> int | None:
         hashed_password = await HashSecurity.get_hash(creds.password)
-
-        result = await session.execute(
-            insert(Business)
-            .values(email=creds.email,
-                    hashed_password=hashed_password,
-                    is_deleted=False)
-            .returning(Business.id))
-        await session.commit()
-        business_id = result.scalar()
-
-        registration_data = [
-            BusinessFinance(
-                business_id=business_id,
-                balance=0,
-                revenue=0,
-                earnings=0),
-            BusinessProfile(
-                business_id=business_id,
-                title='',
-                description='',
-                location='Чайковский',
-                date_joined=datetime.utcnow())
-        ]
-
-        session.add_all(registration_data)
-        await session.commit()
+        try:
+            result = await session.execute(
+                REGISTER_BUSINESS_QUERY,
+                {'email': creds.email, 'hashed_password': hashed_password, 'now': datetime.utcnow()})
+            business_id = result.scalar()
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            return None
         return business_id
 
     @staticmethod
-    @logger.catch
-    async def get_id(
-            session: AsyncSession,
-            creds: SignInScheme
-    ) -> str:
-        result = await session.execute(
-            select(Business.id)
-            .where(Business.email == creds.email))
-        return result.scalar()
-
-    @staticmethod
-    @logger.catch
-    async def verify_password(
+    @logger.catch(exclude=HashPoolBusy)
+    async def authenticate(
             session: AsyncSession,
             creds: SignInScheme
-    ) -> bool:
+    ) -> int | None:
+        # id, хэш и признак удаления одним запросом
         result = await session.execute(
-            select(Business.hashed_password)
+            select(Business.id, Business.hashed_password, Business.is_deleted)
             .where(Business.email == creds.email))
-        db_hashed_password = result.scalar()
-        return await HashSecurity.verify_hash(message=creds.password, hashed_message=db_hashed_password)
+        account = result.first()
+        if not account or account.is_deleted:
+            return None
+        if not await _verify_and_upgrade(Business, creds, account.hashed_password):
+            return None
+        return account.id
 
     @staticmethod
     @logger.catch
@@ -98,72 +138,39 @@ class BusinessDB:
 class UsersDB:
 
     @staticmethod
-    @logger.catch
-    async def check_exists(
-            session: AsyncSession,
-            creds: SignUpScheme
-    ) -> bool:
-        result = await session.execute(
-            select(User)
-            .where(User.email == creds.email))
-        if result.scalar():
-            return False
-        return True
-
-    @staticmethod
-    @logger.catch
+    @logger.catch(exclude=HashPoolBusy)
     async def register(
             session: AsyncSession,
             creds: SignUpScheme
-    ) -> str:
+    ) -> int | None:
         hashed_password = await HashSecurity.get_hash(creds.password)
-        result = await session.execute(
-            insert(User)
-            .values(email=creds.email, hashed_password=hashed_password,
-                    role='user', is_deleted=False)
-            .returning(User.id))
-
-        await session.commit()
-        user_id = result.scalar()
-
-        registration_data = [
-            UsersBalance(
-                user_id=user_id,
-                balance=0),
-            UsersCart(user_id=user_id),
-            UsersProfile(
-                user_id=user_id,
-                last_login=datetime.utcnow(),
-                date_joined=datetime.utcnow(),
-                location='Чайковский')
-        ]
-        session.add_all(registration_data)
-        await session.commit()
+        try:
+            result = await session.execute(
+                REGISTER_USER_QUERY,
+                {'email': creds.email, 'hashed_password': hashed_password, 'now': datetime.utcnow()})
+            user_id = result.scalar()
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            return None
         return user_id
 
     @staticmethod
-    @logger.catch
-    async def verify_password(
+    @logger.catch(exclude=HashPoolBusy)
+    async def authenticate(
             session: AsyncSession,
             creds: SignInScheme
-    ) -> bool:
+    ) -> int | None:
+        # id, хэш и признак удаления одним запросом
         result = await session.execute(
-            select(User.hashed_password)
+            select(User.id, User.hashed_password, User.is_deleted)
             .where(User.email == creds.email))
-        db_hashed_password = result.scalar()
-        return await HashSecurity.verify_hash(message=creds.password, hashed_message=db_hashed_password)
-
-    @staticmethod
-    @logger.catch
-    async def get_id(
-            session: AsyncSession,
-            creds: SignInScheme
-    ) -> str:
-        result = await session.execute(
-            select(User.id)
-            .where(User.email == creds.email)
-        )
-        return result.scalar()
+        account = result.first()
+        if not account or account.is_deleted:
+            return None
+        if not await _verify_and_upgrade(User, creds, account.hashed_password):
+            return None
+        return account.id
 
     @staticmethod
     @logger.catch
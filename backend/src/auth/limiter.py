@@ -0,0 +1,93 @@
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+
+from backend.src.auth.utils import hash_pool
+from backend.src.global_config import settings
+
+
+class TokenBucketLimiter:
+    # Ведро на ключ: rate токенов в секунду, не больше burst. Вёдра хранятся в LRU
+    # на max_keys ключей, чтобы поток случайных IP или email не съел память
+
+    def __init__(self, rate: float, burst: int, max_keys: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        # 0 - запрос пропущен, иначе через сколько секунд появится токен
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class AuthLimiter:
+    # Отсекает входы и регистрации до хэширования пароля: сначала общий
+    # предел одновременных хэширований, затем вёдра по IP и по email
+
+    def __init__(self, ip_limiter: TokenBucketLimiter, email_limiter: TokenBucketLimiter,
+                 max_concurrent_hashes: int) -> None:
+        self.ip_limiter = ip_limiter
+        self.email_limiter = email_limiter
+        self.max_concurrent_hashes = max_concurrent_hashes
+        self.admitted = 0
+        self.rejected_concurrency = 0
+        self.rejected_ip = 0
+        self.rejected_email = 0
+
+    def _reject(self, retry_after: float) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail='Too many authentication attempts',
+            headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+
+    def admit(self, request: Request, email: str) -> None:
+        if not settings.rate_limit.ENABLED:
+            return
+        if hash_pool.pending >= self.max_concurrent_hashes:
+            self.rejected_concurrency += 1
+            raise self._reject(settings.hashing.RETRY_AFTER)
+        retry_after = self.ip_limiter.acquire(request.client.host if request.client else 'unknown')
+        if retry_after:
+            self.rejected_ip += 1
+            raise self._reject(retry_after)
+        retry_after = self.email_limiter.acquire(email.lower())
+        if retry_after:
+            self.rejected_email += 1
+            raise self._reject(retry_after)
+        self.admitted += 1
+
+    def stats(self) -> dict:
+        return {
+            'admitted': self.admitted,
+            'rejected': self.rejected_concurrency + self.rejected_ip + self.rejected_email,
+            'rejected_concurrency': self.rejected_concurrency,
+            'rejected_ip': self.rejected_ip,
+            'rejected_email': self.rejected_email,
+        }
+
+
+auth_limiter = AuthLimiter(
+    ip_limiter=TokenBucketLimiter(
+        rate=settings.rate_limit.IP_RATE,
+        burst=settings.rate_limit.IP_BURST,
+        max_keys=settings.rate_limit.MAX_KEYS),
+    email_limiter=TokenBucketLimiter(
+        rate=settings.rate_limit.EMAIL_RATE,
+        burst=settings.rate_limit.EMAIL_BURST,
+        max_keys=settings.rate_limit.MAX_KEYS),
+    max_concurrent_hashes=settings.rate_limit.MAX_CONCURRENT_HASHES)
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Cookie, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Cookie, Request, Response
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.src.auth.db import BusinessDB, UsersDB
+from backend.src.auth.limiter import auth_limiter
 from backend.src.auth.models import SignUpScheme, SignInScheme
 from backend.src.auth.utils import JWTAuth
 from backend.src.db_core.helper import db_helper
@@ -18,15 +19,16 @@ router = APIRouter(
 @router.post('/business/sign-up')
 async def business_sign_up(
         response: Response,
+        request: Request,
         creds: SignUpScheme,
         session: AsyncSession = Depends(db_helper.get_async_session),
 ) -> JSONResponse:
-    if not await BusinessDB.check_exists(session, creds):
+    auth_limiter.admit(request, creds.email)
+    business_id = await BusinessDB.register(session, creds)
+    if not business_id:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Business with provided email already exists.")
-
-    business_id = await BusinessDB.register(session, creds)
     access_token = await JWTAuth.create_access(user_id=business_id, token_for='business')
     refresh_token = await JWTAuth.create_refresh(user_id=business_id, token_for='business')
 
@@ -43,18 +45,18 @@ async def business_sign_up(
 @router.post('/business/sign-in')
 async def business_sign_in(
         response: Response,
+        request: Request,
         creds: SignInScheme,
         session: AsyncSession = Depends(db_helper.get_async_session)
 ) -> JSONResponse:
-    if not await BusinessDB.verify_password(session=session,
-                                            creds=creds):
+    auth_limiter.admit(request, creds.email)
+    business_id = await BusinessDB.authenticate(session=session,
+                                                creds=creds)
+    if not business_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password.")
 
-    business_id = await BusinessDB.get_id(creds=creds,
-                                          session=session)
-
     access_token = await JWTAuth.create_access(user_id=business_id, token_for='business')
     refresh_token = await JWTAuth.create_refresh(user_id=business_id, token_for='business')
 
@@ -71,14 +73,16 @@ async def business_sign_in(
 @router.post('/user/sign-up')
 async def user_sign_up(
         response: Response,
+        request: Request,
         creds: SignUpScheme,
         session: AsyncSession = Depends(db_helper.get_async_session)
 ) -> JSONResponse:
-    if not await UsersDB.check_exists(session=session, creds=creds):
+    auth_limiter.admit(request, creds.email)
+    uid = await UsersDB.register(session, creds)
+    if not uid:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="User with provided email already exists.")
-    uid = await UsersDB.register(session, creds)
     access_token = await JWTAuth.create_access(user_id=uid, token_for='user')
     refresh_token = await JWTAuth.create_refresh(user_id=uid, token_for='user')
 
@@ -95,16 +99,17 @@ async def user_sign_up(
 @router.post('/user/sign-in')
 async def user_sign_in(
         response: Response,
+        request: Request,
         creds: SignInScheme,
         session: AsyncSession = Depends(db_helper.get_async_session)
 ) -> JSONResponse:
-    if not await UsersDB.verify_password(session=session,
-                                         creds=creds):
+    auth_limiter.admit(request, creds.email)
+    uid = await UsersDB.authenticate(session=session,
+                                     creds=creds)
+    if not uid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password.")
-    uid = await UsersDB.get_id(session=session,
-                               creds=creds)
     access_token = await JWTAuth.create_access(user_id=uid, token_for='user')
     refresh_token = await JWTAuth.create_refresh(user_id=uid, token_for='user')
 
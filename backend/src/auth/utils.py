@@ -1,13 +1,78 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 from argon2 import PasswordHasher
 from authx import AuthX, TokenPayload
 from loguru import logger
 
 from backend.src.auth.config import authx_config
+from backend.src.global_config import settings
 
-ph = PasswordHasher()
+ph = PasswordHasher(
+    time_cost=settings.hashing.TIME_COST,
+    memory_cost=settings.hashing.MEMORY_COST,
+    parallelism=settings.hashing.PARALLELISM)
 authx_security = AuthX(config=authx_config)
 
 
+class HashPoolBusy(Exception):
+    pass
+
+
+class HashPool:
+    # Argon2 считается в отдельных потоках (argon2-cffi отпускает GIL), event loop
+    # не блокируется. Число ожидающих хэширования ограничено: при переполнении запрос
+    # ждёт свободное место не дольше ACQUIRE_TIMEOUT и получает HashPoolBusy
+
+    def __init__(self, workers: int, max_pending: int, acquire_timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.acquire_timeout = acquire_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='argon2')
+        self._slots = asyncio.Semaphore(max_pending)
+        self._latencies = deque(maxlen=1000)
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, func, *args):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HashPoolBusy()
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._latencies.append((time.perf_counter() - started) * 1000)
+            self.completed += 1
+            self.pending -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'queue_depth': max(self.pending - self.workers, 0),
+            'in_flight': self.pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'latency_p50_ms': round(latencies[len(latencies) // 2], 2) if latencies else None,
+            'latency_p99_ms': round(latencies[int(len(latencies) * 0.99)], 2) if latencies else None,
+        }
+
+
+hash_pool = HashPool(
+    workers=settings.hashing.WORKERS,
+    max_pending=settings.hashing.MAX_PENDING,
+    acquire_timeout=settings.hashing.ACQUIRE_TIMEOUT)
+
+
 class JWTAuth:
 
     @staticmethod
@@ -32,14 +97,22 @@ class JWTAuth:
 class HashSecurity:
 
     @staticmethod
-    @logger.catch
+    @logger.catch(exclude=HashPoolBusy)
     async def get_hash(message: str) -> str:
-        return ph.hash(message)
+        return await hash_pool.run(ph.hash, message)
 
     @staticmethod
-    @logger.catch
+    @logger.catch(exclude=HashPoolBusy)
     async def verify_hash(message: str, hashed_message: str) -> bool:
         try:
-            return ph.verify(hashed_message, message)
+            return await hash_pool.run(ph.verify, hashed_message, message)
+        except HashPoolBusy:
+            raise
         except:
             return False
+
+    @staticmethod
+    @logger.catch
+    async def needs_rehash(hashed_message: str) -> bool:
+        # Хэш создан с параметрами, отличными от текущих настроек
+        return ph.check_needs_rehash(hashed_message)
@@ -2,6 +2,7 @@ from sqlalchemy import (Column, Integer, String, BigInteger,
                         Boolean, SmallInteger, TIMESTAMP,
                         ARRAY, FLOAT)
 
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase
 
 
@@ -22,7 +23,7 @@ class Business(Base):
     __tablename__ = 'businesses'
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     hashed_password = Column(String(500), nullable=False)
-    email = Column(String(50), nullable=False)
+    email = Column(String(50), unique=True, nullable=False)
     is_deleted = Column(Boolean, nullable=False)
 
 
@@ -50,6 +51,8 @@ class Order(Base):
     creator_id = Column(BigInteger)
     is_canceled = Column(Boolean, nullable=False)
     is_deleted = Column(Boolean, nullable=False)
+    status = Column(String(30), nullable=False, server_default='created')
+    status_detail = Column(JSONB)
 
 
 class UsersProfile(Base):
@@ -66,6 +69,29 @@ class UsersCart(Base):
     shopping_cart = Column(ARRAY(Integer), nullable=False)
 
 
+class CartItem(Base):
+    __tablename__ = 'cart_items'
+    user_id = Column(BigInteger, primary_key=True)
+    product_id = Column(BigInteger, primary_key=True)
+    quantity = Column(Integer, nullable=False)
+
+
+class CartBufferCheckpoint(Base):
+    __tablename__ = 'cart_buffer_checkpoints'
+    node_id = Column(String(50), primary_key=True)
+    seq = Column(BigInteger, nullable=False)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_keys'
+    user_id = Column(BigInteger, primary_key=True)
+    scope = Column(String(255), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    status_code = Column(SmallInteger)
+    response = Column(JSONB)
+    created_at = Column(TIMESTAMP, nullable=False)
+
+
 class UsersBalance(Base):
     __tablename__ = 'users_balance'
     user_id = Column(BigInteger, primary_key=True)
@@ -111,6 +137,22 @@ class ProductDate(Base):
     end_date = Column(TIMESTAMP)
 
 
+class SellableProduct(Base):
+    __tablename__ = 'sellable_products'
+    product_id = Column(BigInteger, primary_key=True)
+    name = Column(String(50), nullable=False)
+    price = Column(BigInteger, nullable=False)
+    category_id = Column(SmallInteger, nullable=False)
+    creator_id = Column(BigInteger, nullable=False)
+    description = Column(String(500), nullable=False)
+    logo_path = Column(String(255))
+    sex = Column(String(15), nullable=False)
+    adult_only = Column(Boolean, nullable=False)
+    start_date = Column(TIMESTAMP, nullable=False)
+    end_date = Column(TIMESTAMP)
+    quanity = Column(BigInteger, nullable=False)
+
+
 class OrderDate(Base):
     __tablename__ = 'order_date'
     order_id = Column(BigInteger, primary_key=True)
@@ -3,6 +3,7 @@ from time import time
 
 from dotenv import load_dotenv
 from loguru import logger
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings
 
 load_dotenv()
@@ -14,6 +15,93 @@ class DatabaseSettings(BaseSettings):
     MAX_OVERFLOW: int = 10
 
 
+class PaginationSettings(BaseSettings):
+    DEFAULT_PAGE_SIZE: int = 30
+    MAX_PAGE_SIZE: int = 100
+    # Ключ подписи курсоров обязателен: с пустым ключом курсор подделывается
+    CURSOR_SECRET_KEY: str = Field(min_length=1)
+
+
+class CacheSettings(BaseSettings):
+    CATEGORY_TTL: int = 300
+    PRODUCT_TTL: int = 30
+    PRODUCT_MAX_SIZE: int = 10000
+    TOKEN_CACHE_ENABLED: bool = True
+    TOKEN_MAX_SIZE: int = 10000
+
+
+class ImportSettings(BaseSettings):
+    BATCH_SIZE: int = 500
+
+
+class TasksSettings(BaseSettings):
+    SELLABLE_EXPIRE_INTERVAL: int = 60
+    LEDGER_ROLLUP_INTERVAL: int = 10
+    LEDGER_ROLLUP_BATCH: int = 5000
+
+
+class CartSettings(BaseSettings):
+    # Предел количества одного товара в корзине, с запасом ниже integer в cart_items
+    MAX_ITEM_QUANTITY: int = 10000
+
+
+class CartBufferSettings(BaseSettings):
+    ENABLED: bool = False
+    FLUSH_INTERVAL: float = 1.0
+    # NODE_ID задаётся каждому процессу отдельно: под ним в базе хранится отметка
+    # записанных изменений, по нему же по умолчанию называется журнал.
+    # Пустой JOURNAL_PATH - буфер только в памяти, без восстановления после падения
+    NODE_ID: str | None = None
+    JOURNAL_PATH: str | None = None
+
+    @model_validator(mode='after')
+    def require_node_id(self) -> 'CartBufferSettings':
+        if self.ENABLED and not self.NODE_ID:
+            raise ValueError('CART_BUFFER_NODE_ID must be set per process when the cart buffer is enabled')
+        if self.JOURNAL_PATH is None and self.NODE_ID:
+            self.JOURNAL_PATH = f'cart_buffer.{self.NODE_ID}.journal'
+        return self
+
+
+class IdempotencySettings(BaseSettings):
+    TTL: int = 86400
+    # Через сколько секунд незавершённый запрос с тем же ключом можно перехватить
+    LEASE: int = 30
+    WAIT: float = 10.0
+    POLL_INTERVAL: float = 0.1
+    CLEANUP_INTERVAL: int = 3600
+
+
+class CheckoutQueueSettings(BaseSettings):
+    ENABLED: bool = False
+    WORKERS: int = 4
+    MAX_SIZE: int = 1000
+    RETRY_AFTER: int = 5
+    MAX_WAIT: int = 30
+    RECOVER_INTERVAL: int = 60
+
+
+class HashingSettings(BaseSettings):
+    # Параметры Argon2 подбираются под железо: python -m backend.src.auth.calibrate
+    TIME_COST: int = 3
+    MEMORY_COST: int = 65536
+    PARALLELISM: int = 4
+    WORKERS: int = 4
+    MAX_PENDING: int = 64
+    ACQUIRE_TIMEOUT: float = 2.0
+    RETRY_AFTER: int = 1
+
+
+class RateLimitSettings(BaseSettings):
+    ENABLED: bool = True
+    IP_RATE: float = 1.0
+    IP_BURST: int = 20
+    EMAIL_RATE: float = 0.2
+    EMAIL_BURST: int = 5
+    MAX_KEYS: int = 100000
+    MAX_CONCURRENT_HASHES: int = 32
+
+
 class RoutersPrefix(BaseSettings):
     AUTH: str
     PRODUCTS: str
@@ -36,6 +124,16 @@ class Settings(BaseSettings):
     SERVER_PORT: int = 8765
     IP_ADDRESS: str = 'localhost'
     db: DatabaseSettings
+    pagination: PaginationSettings
+    cache: CacheSettings
+    imports: ImportSettings
+    tasks: TasksSettings
+    cart: CartSettings
+    cart_buffer: CartBufferSettings
+    idempotency: IdempotencySettings
+    checkout_queue: CheckoutQueueSettings
+    hashing: HashingSettings
+    rate_limit: RateLimitSettings
     prefix: RoutersPrefix
     logger: LoggerSettings
 
@@ -49,6 +147,68 @@ settings = Settings(
         POOL_SIZE=int(os.getenv('POOL_SIZE', '100')),
         MAX_OVERFLOW=int(os.getenv('MAX_OVERFLOW', '50')),
     ),
+    pagination=PaginationSettings(
+        DEFAULT_PAGE_SIZE=int(os.getenv('PAGE_SIZE', '30')),
+        MAX_PAGE_SIZE=int(os.getenv('MAX_PAGE_SIZE', '100')),
+        CURSOR_SECRET_KEY=os.getenv('CURSOR_SECRET_KEY'),
+    ),
+    cache=CacheSettings(
+        CATEGORY_TTL=int(os.getenv('CATEGORY_CACHE_TTL', '300')),
+        PRODUCT_TTL=int(os.getenv('PRODUCT_CACHE_TTL', '30')),
+        PRODUCT_MAX_SIZE=int(os.getenv('PRODUCT_CACHE_SIZE', '10000')),
+        TOKEN_CACHE_ENABLED=os.getenv('TOKEN_CACHE_ENABLED', 'true').lower() == 'true',
+        TOKEN_MAX_SIZE=int(os.getenv('TOKEN_CACHE_SIZE', '10000')),
+    ),
+    imports=ImportSettings(
+        BATCH_SIZE=int(os.getenv('IMPORT_BATCH_SIZE', '500')),
+    ),
+    tasks=TasksSettings(
+        SELLABLE_EXPIRE_INTERVAL=int(os.getenv('SELLABLE_EXPIRE_INTERVAL', '60')),
+        LEDGER_ROLLUP_INTERVAL=int(os.getenv('LEDGER_ROLLUP_INTERVAL', '10')),
+        LEDGER_ROLLUP_BATCH=int(os.getenv('LEDGER_ROLLUP_BATCH', '5000')),
+    ),
+    cart=CartSettings(
+        MAX_ITEM_QUANTITY=int(os.getenv('CART_MAX_ITEM_QUANTITY', '10000')),
+    ),
+    cart_buffer=CartBufferSettings(
+        ENABLED=os.getenv('CART_BUFFER_ENABLED', 'false').lower() == 'true',
+        FLUSH_INTERVAL=float(os.getenv('CART_BUFFER_FLUSH_INTERVAL', '1.0')),
+        NODE_ID=os.getenv('CART_BUFFER_NODE_ID'),
+        JOURNAL_PATH=os.getenv('CART_BUFFER_JOURNAL'),
+    ),
+    idempotency=IdempotencySettings(
+        TTL=int(os.getenv('IDEMPOTENCY_TTL', '86400')),
+        LEASE=int(os.getenv('IDEMPOTENCY_LEASE', '30')),
+        WAIT=float(os.getenv('IDEMPOTENCY_WAIT', '10.0')),
+        POLL_INTERVAL=float(os.getenv('IDEMPOTENCY_POLL_INTERVAL', '0.1')),
+        CLEANUP_INTERVAL=int(os.getenv('IDEMPOTENCY_CLEANUP_INTERVAL', '3600')),
+    ),
+    checkout_queue=CheckoutQueueSettings(
+        ENABLED=os.getenv('ASYNC_CHECKOUT_ENABLED', 'false').lower() == 'true',
+        WORKERS=int(os.getenv('CHECKOUT_WORKERS', '4')),
+        MAX_SIZE=int(os.getenv('CHECKOUT_QUEUE_SIZE', '1000')),
+        RETRY_AFTER=int(os.getenv('CHECKOUT_RETRY_AFTER', '5')),
+        MAX_WAIT=int(os.getenv('ORDER_STATUS_MAX_WAIT', '30')),
+        RECOVER_INTERVAL=int(os.getenv('CHECKOUT_RECOVER_INTERVAL', '60')),
+    ),
+    hashing=HashingSettings(
+        TIME_COST=int(os.getenv('ARGON2_TIME_COST', '3')),
+        MEMORY_COST=int(os.getenv('ARGON2_MEMORY_COST', '65536')),
+        PARALLELISM=int(os.getenv('ARGON2_PARALLELISM', '4')),
+        WORKERS=int(os.getenv('HASH_WORKERS', str(os.cpu_count() or 4))),
+        MAX_PENDING=int(os.getenv('HASH_MAX_PENDING', '64')),
+        ACQUIRE_TIMEOUT=float(os.getenv('HASH_ACQUIRE_TIMEOUT', '2.0')),
+        RETRY_AFTER=int(os.getenv('HASH_RETRY_AFTER', '1')),
+    ),
+    rate_limit=RateLimitSettings(
+        ENABLED=os.getenv('AUTH_RATE_LIMIT_ENABLED', 'true').lower() == 'true',
+        IP_RATE=float(os.getenv('AUTH_IP_RATE', '1.0')),
+        IP_BURST=int(os.getenv('AUTH_IP_BURST', '20')),
+        EMAIL_RATE=float(os.getenv('AUTH_EMAIL_RATE', '0.2')),
+        EMAIL_BURST=int(os.getenv('AUTH_EMAIL_BURST', '5')),
+        MAX_KEYS=int(os.getenv('AUTH_RATE_LIMIT_KEYS', '100000')),
+        MAX_CONCURRENT_HASHES=int(os.getenv('AUTH_MAX_CONCURRENT_HASHES', '32')),
+    ),
     prefix=RoutersPrefix(
         AUTH='/v1/api/auth',
         PRODUCTS='/v1/api/products',
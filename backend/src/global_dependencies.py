@@ -6,6 +6,7 @@ from fastapi import File, UploadFile, HTTPException, Cookie
 from loguru import logger
 from pydantic import BaseModel
 
+from backend.src.auth.cache import token_cache
 from backend.src.auth.utils import JWTAuth
 
 ALLOWED_EXTENSIONS = {".png", ".jpg", ".jpeg"}
@@ -24,6 +25,10 @@ async def random_file_name() -> str:
 async def get_payload_by_access_token(
         access_token: str = Cookie('access_token')
 ) -> HTTPException | TokenPayloadModel:
+    # Повторная проверка подписи не нужна, пока токен в кэше и не истёк
+    cached_payload = token_cache.get(access_token)
+    if cached_payload:
+        return cached_payload
     token_payload = await JWTAuth.decode_token(access_token)
     if not token_payload or token_payload == 'Token expired' or token_payload.type != 'access':
         raise HTTPException(status_code=401, detail="Invalid access token.")
@@ -32,7 +37,9 @@ async def get_payload_by_access_token(
         raise HTTPException(status_code=401, detail="Invalid access token.")
     try:
         int(sub[1])
-        return TokenPayloadModel(uid=sub[1], role=sub[0])
+        payload = TokenPayloadModel(uid=sub[1], role=sub[0])
+        token_cache.put(access_token, payload, token_payload.exp)
+        return payload
     except ValueError:
         logger.critical(f"SECURITY ALERT: role:{sub[0]} uid:{sub[1]}")
         raise HTTPException(status_code=401, detail="Invalid access token.")
@@ -1,13 +1,26 @@
+import asyncio
 import time
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from loguru import logger
 
+from backend.src.auth.cache import token_cache
+from backend.src.auth.limiter import auth_limiter
+from backend.src.auth.utils import HashPoolBusy, hash_pool
+from backend.src.db_core.helper import db_helper
 from backend.src.global_config import settings
+from backend.src.orders.cart_buffer import cart_buffer, CartFlushError
+from backend.src.orders.checkout_queue import checkout_queue
+from backend.src.orders.db import UsersDB
+from backend.src.orders.tasks import flush_cart_buffer, delete_expired_idempotency_keys, requeue_pending_orders
+from backend.src.products.cache import category_cache, product_cache
+from backend.src.products.tasks import expire_sellable_products
+from backend.src.profile.tasks import rollup_business_ledger
 
 from backend.src.auth.router import router as auth_router
 from backend.src.orders.router import router as order_router
@@ -18,6 +31,27 @@ from backend.src.profile.router import router as profile_router
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     logger.info("Application lifespan started")
+    async with db_helper.session_factory() as session:
+        await category_cache.load(session)
+        if settings.cart_buffer.ENABLED:
+            replayed = await UsersDB.recover_cart_buffer(session=session)
+            logger.info(f"Cart buffer mutations replayed from journal: {replayed}")
+    background_tasks = [
+        asyncio.create_task(expire_sellable_products(settings.tasks.SELLABLE_EXPIRE_INTERVAL)),
+        asyncio.create_task(rollup_business_ledger(
+            settings.tasks.LEDGER_ROLLUP_INTERVAL, settings.tasks.LEDGER_ROLLUP_BATCH)),
+        asyncio.create_task(delete_expired_idempotency_keys(
+            settings.idempotency.CLEANUP_INTERVAL, settings.idempotency.TTL)),
+    ]
+    if settings.cart_buffer.ENABLED:
+        background_tasks.append(
+            asyncio.create_task(flush_cart_buffer(settings.cart_buffer.FLUSH_INTERVAL)))
+    if settings.checkout_queue.ENABLED:
+        background_tasks.extend(checkout_queue.start(settings.checkout_queue.WORKERS))
+        background_tasks.append(
+            asyncio.create_task(requeue_pending_orders(settings.checkout_queue.RECOVER_INTERVAL)))
+        requeued = await checkout_queue.recover()
+        logger.info(f"Pending orders requeued: {requeued}")
     try:
         yield
 
@@ -27,6 +61,12 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     finally:
 
         try:
+            for task in background_tasks:
+                task.cancel()
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+            if settings.cart_buffer.ENABLED:
+                async with db_helper.session_factory() as session:
+                    await UsersDB.flush_cart_buffer(session=session)
             server_uptime = int(time.time() - settings.SERVER_START_TIME)
             logger.info(f"Server total uptime: {server_uptime} seconds")
 
@@ -51,11 +91,39 @@ main_app.include_router(profile_router)
 main_app.include_router(order_router)
 
 
+@main_app.exception_handler(HashPoolBusy)
+async def hash_pool_busy_handler(request: Request, error: HashPoolBusy) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={'detail': 'Too many authentication requests'},
+        headers={'Retry-After': str(settings.hashing.RETRY_AFTER)})
+
+
+@main_app.exception_handler(CartFlushError)
+async def cart_flush_error_handler(request: Request, error: CartFlushError) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={'detail': 'Cart is temporarily unavailable'},
+        headers={'Retry-After': str(settings.checkout_queue.RETRY_AFTER)})
+
+
 @main_app.get("/ping")
 async def get_ping():
     return {"uptime": int(time.time() - settings.SERVER_START_TIME)}
 
 
+@main_app.get("/metrics")
+async def get_metrics():
+    return {
+        "product_cache": product_cache.stats(),
+        "cart_buffer": cart_buffer.stats(),
+        "checkout_queue": checkout_queue.stats(),
+        "hashing": hash_pool.stats(),
+        "token_cache": token_cache.stats(),
+        "auth_limiter": auth_limiter.stats(),
+    }
+
+
 @logger.catch
 def start_server():
     uvicorn.run(
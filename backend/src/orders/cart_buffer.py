@@ -0,0 +1,209 @@
+import asyncio
+import fcntl
+import json
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from backend.src.global_config import settings
+
+
+class JournalInUse(Exception):
+    pass
+
+
+class CartFlushError(Exception):
+    pass
+
+
+class MemoryCartStore:
+    # Изменения живут только в памяти процесса и теряются при падении
+
+    def load(self) -> List[dict]:
+        return []
+
+    def close(self) -> None:
+        pass
+
+    def append(self, mutation: dict) -> None:
+        pass
+
+    def truncate(self) -> None:
+        pass
+
+
+class JournalCartStore:
+    # Журнал только на дозапись: каждое изменение корзины сбрасывается на диск
+    # до ответа клиенту и переигрывается при старте, если не успело попасть в базу.
+    # Журнал блокируется на всё время жизни процесса: второй процесс с тем же
+    # журналом не запустится, а не будет переигрывать чужие изменения
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            journal = open(self.path, 'a', encoding='utf-8')
+            try:
+                fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                journal.close()
+                raise JournalInUse(f'Cart buffer journal {self.path} is used by another process')
+            self._file = journal
+        return self._file
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def load(self) -> List[dict]:
+        self._open()
+        mutations = []
+        with open(self.path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    mutations.append(json.loads(line))
+                except ValueError:
+                    # Недописанная строка при падении - последняя в журнале
+                    break
+        return mutations
+
+    def append(self, mutation: dict) -> None:
+        journal = self._open()
+        journal.write(json.dumps(mutation) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+
+    def truncate(self) -> None:
+        journal = self._open()
+        journal.truncate(0)
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+# (user_ids очищенных корзин, строки (user_id, product_id, delta), seq) -> успех записи
+FlushApply = Callable[[List[int], List[Tuple[int, int, int]], int], Awaitable[bool]]
+
+
+class CartBuffer:
+    # Отложенная запись корзин: изменения складываются в дельты по (user_id, product_id)
+    # и пачкой уходят в cart_items. Каждое изменение получает seq, последний записанный
+    # seq хранится в базе вместе с пачкой - повтор журнала после падения не задвоит корзину
+
+    def __init__(self, store, node_id: str):
+        self.store = store
+        self.node_id = node_id
+        self._pending: Dict[int, dict] = {}
+        self._seq = 0
+        self._lock = asyncio.Lock()
+        self._flush_times = deque()
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flushed_rows = 0
+
+    def _apply(self, mutation: dict) -> None:
+        cart = self._pending.setdefault(mutation['user_id'], {'clear': False, 'deltas': {}})
+        if mutation['op'] == 'clear':
+            cart['clear'] = True
+            cart['deltas'] = {}
+            return
+        deltas = cart['deltas']
+        product_id = mutation['product_id']
+        deltas[product_id] = deltas.get(product_id, 0) + mutation['delta']
+        if not deltas[product_id]:
+            del deltas[product_id]
+
+    async def _append(self, mutation: dict) -> None:
+        self._seq += 1
+        mutation['seq'] = self._seq
+        await asyncio.to_thread(self.store.append, mutation)
+        self._apply(mutation)
+
+    async def _record(self, mutation: dict) -> None:
+        async with self._lock:
+            await self._append(mutation)
+
+    async def add(self, user_id: int, product_id: int, quantity: int,
+                  stored: int = 0, limit: int | None = None) -> bool:
+        # stored - количество в базе; итог с незаписанными изменениями проверяется
+        # под блокировкой, чтобы параллельные добавления не превысили limit
+        async with self._lock:
+            if limit is not None:
+                merged = self.merge(user_id, {product_id: stored}).get(product_id, 0)
+                if merged + quantity > limit:
+                    return False
+            await self._append({'op': 'add', 'user_id': user_id, 'product_id': product_id, 'delta': quantity})
+        return True
+
+    async def remove(self, user_id: int, product_id: int, quantity: int) -> None:
+        await self._record({'op': 'remove', 'user_id': user_id, 'product_id': product_id, 'delta': -quantity})
+
+    async def clear(self, user_id: int) -> None:
+        await self._record({'op': 'clear', 'user_id': user_id})
+
+    def merge(self, user_id: int, cart: Dict[int, int]) -> Dict[int, int]:
+        # Накладывает незаписанные изменения на корзину, прочитанную из базы
+        pending = self._pending.get(user_id)
+        if not pending:
+            return cart
+        merged = {} if pending['clear'] else dict(cart)
+        for product_id, delta in pending['deltas'].items():
+            quantity = merged.get(product_id, 0) + delta
+            if quantity > 0:
+                merged[product_id] = quantity
+            else:
+                merged.pop(product_id, None)
+        return dict(sorted(merged.items()))
+
+    async def recover(self, checkpoint: int) -> int:
+        mutations = await asyncio.to_thread(self.store.load)
+        replayed = 0
+        async with self._lock:
+            self._seq = max([checkpoint] + [mutation['seq'] for mutation in mutations])
+            for mutation in mutations:
+                if mutation['seq'] > checkpoint:
+                    self._apply(mutation)
+                    replayed += 1
+        return replayed
+
+    async def flush(self, apply: FlushApply) -> int:
+        async with self._lock:
+            if not self._pending:
+                return 0
+            cleared = [user_id for user_id, cart in self._pending.items() if cart['clear']]
+            rows = [
+                (user_id, product_id, delta)
+                for user_id, cart in self._pending.items()
+                for product_id, delta in cart['deltas'].items()]
+            if not await apply(cleared, rows, self._seq):
+                # Изменения остаются в буфере и журнале до следующей попытки
+                self.failed_flushes += 1
+                raise CartFlushError('Cart buffer flush failed')
+            self._pending = {}
+            await asyncio.to_thread(self.store.truncate)
+            self.flushes += 1
+            self.flushed_rows += len(rows)
+            self._flush_times.append(time.monotonic())
+            return len(rows)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        while self._flush_times and now - self._flush_times[0] > 60:
+            self._flush_times.popleft()
+        return {
+            'pending_users': len(self._pending),
+            'pending_rows': sum(len(cart['deltas']) for cart in self._pending.values()),
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'flushed_rows': self.flushed_rows,
+            'flushes_per_second': round(len(self._flush_times) / 60, 3),
+        }
+
+
+cart_buffer = CartBuffer(
+    store=JournalCartStore(settings.cart_buffer.JOURNAL_PATH)
+    if settings.cart_buffer.JOURNAL_PATH else MemoryCartStore(),
+    node_id=settings.cart_buffer.NODE_ID)
@@ -0,0 +1,107 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Set
+
+from loguru import logger
+
+from backend.src.db_core.helper import db_helper
+from backend.src.global_config import settings
+from backend.src.orders.db import UsersDB
+
+
+class CheckoutQueue:
+    # Асинхронное оформление заказов: запрос только ставит pending-заказ в очередь,
+    # покупку проводит ограниченное число воркеров, поэтому одновременных
+    # транзакций оформления не больше WORKERS, как бы ни рос входящий поток
+
+    def __init__(self, max_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._waiters: Dict[int, asyncio.Event] = {}
+        self._watchers: Dict[int, int] = {}
+        # Заказы в очереди или в работе у этого процесса - recover их не дублирует
+        self._queued: Set[int] = set()
+        self.in_progress = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, order_id: int, user_id: int) -> bool:
+        if order_id in self._queued:
+            return True
+        try:
+            self.queue.put_nowait((order_id, user_id))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self._queued.add(order_id)
+        return True
+
+    def start(self, workers: int) -> List[asyncio.Task]:
+        return [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+    async def _worker(self) -> None:
+        while True:
+            order_id, user_id = await self.queue.get()
+            self.in_progress += 1
+            try:
+                async with db_helper.session_factory() as session:
+                    if await UsersDB.lock_pending_order(session=session, order_id=order_id):
+                        result = await UsersDB.checkout(session=session, user_id=user_id, order_id=order_id)
+                        if not result or result.status != 'created':
+                            await session.rollback()
+                            await UsersDB.fail_order(session=session, order_id=order_id, result=result)
+                            self.failed += 1
+                        self.processed += 1
+            except Exception as error:
+                # Заказ не остаётся pending до перезапуска: он помечается failed,
+                # а если не удалось и это, его подберёт периодический recover
+                logger.error(f'Checkout worker failed on order {order_id}: {error}')
+                self.failed += 1
+                async with db_helper.session_factory() as session:
+                    await UsersDB.fail_order(session=session, order_id=order_id, result=None)
+            finally:
+                self._queued.discard(order_id)
+                self.in_progress -= 1
+                self.queue.task_done()
+                event = self._waiters.get(order_id)
+                if event:
+                    event.set()
+
+    @contextmanager
+    def watch(self, order_id: int) -> Iterator[asyncio.Event]:
+        # Событие регистрируется до чтения статуса, поэтому завершение между чтением
+        # и ожиданием не теряется. Событие общее для всех ждущих этот заказ и удаляется,
+        # когда уходит последний. Заказ из очереди другого процесса событие не разбудит,
+        # поэтому ожидание ограничивается и статус перечитывается из базы
+        event = self._waiters.setdefault(order_id, asyncio.Event())
+        self._watchers[order_id] = self._watchers.get(order_id, 0) + 1
+        try:
+            yield event
+        finally:
+            self._watchers[order_id] -= 1
+            if not self._watchers[order_id]:
+                del self._watchers[order_id]
+                del self._waiters[order_id]
+
+    async def recover(self) -> int:
+        # Заказы, оставшиеся pending (перезапуск, сбой воркера или другого процесса),
+        # снова ставятся в очередь. Повтор безопасен: lock_pending_order проведёт заказ один раз
+        async with db_helper.session_factory() as session:
+            pending = await UsersDB.get_pending_orders(
+                session=session,
+                limit=self.queue.maxsize - self.queue.qsize(),
+                exclude=list(self._queued))
+        return sum(self.submit(order_id, user_id) for order_id, user_id in pending or [])
+
+    def stats(self) -> dict:
+        return {
+            'queued': self.queue.qsize(),
+            'max_size': self.queue.maxsize,
+            'in_progress': self.in_progress,
+            'processed': self.processed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
+
+
+checkout_queue = CheckoutQueue(max_size=settings.checkout_queue.MAX_SIZE)
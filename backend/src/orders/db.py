@@ -1,18 +1,228 @@
-from datetime import datetime
-from collections import Counter
+from datetime import datetime, timedelta
+from functools import partial
 from typing import List
 
 from loguru import logger
-from sqlalchemy import update, select, Integer, cast, func, text
-from sqlalchemy.dialects.postgresql import array, ARRAY, insert
+from sqlalchemy import update, select, delete, text, func, and_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.sql.functions import session_user, coalesce
 
-from backend.src.db_core.tables import (UsersCart, Order, OrderCart, ProductQuanity, Product,
-                                        OrderDate, OrderPrice, UsersBalance, BusinessFinance)
-from backend.src.orders.models import ProductCartInfo
+from backend.src.db_core.tables import (CartItem, Order, OrderCart, Product, OrderDate, OrderPrice,
+                                        UsersBalance, CartBufferCheckpoint,
+                                        IdempotencyKey)
+from backend.src.global_config import settings
+from backend.src.orders.cart_buffer import cart_buffer, CartFlushError, JournalInUse
+from backend.src.orders.models import (ProductCartInfo, CheckoutResult, CartValidation, OrderStatusScheme,
+                                       OrderHistoryScheme, OrderHistoryPageScheme)
+from backend.src.products.cache import product_cache
 from backend.src.products.db import BusinessDB as ProductBusinessDB
-from backend.src.profile.db import UsersDB as ProfileUsersDB
+from backend.src.products.utils import encode_cursor
+
+# Списание остатков, позиции заказа и зачисление продавцам для всей корзины:
+# корзина разворачивается через unnest, продавцы группируются по creator_id.
+# Цены берутся из проверки корзины - продавцам зачисляется ровно то, что списано с покупателя.
+# Начисления только дописываются в business_ledger (в копейках, комиссия 2%),
+# строки продавцов не блокируются - итоги сворачивает фоновая задача.
+# Запрос возвращает число списанных и ожидаемых позиций: расхождение значит, что
+# остаток изменился после проверки, и транзакция откатывается
+SETTLE_CART_QUERY = text("""
+    WITH cart AS (
+        SELECT product_id, quantity, price
+        FROM unnest(CAST(:product_ids AS bigint[]), CAST(:quantities AS integer[]), CAST(:prices AS bigint[]))
+                 AS cart(product_id, quantity, price)
+    ), lines AS (
+        SELECT cart.product_id, cart.quantity, p.creator_id, cart.price
+        FROM cart
+                 JOIN products p ON p.id = cart.product_id
+    ), stock AS (
+        UPDATE product_quanity pq
+        SET quanity = coalesce(pq.quanity, 0) - lines.quantity
+        FROM lines
+        WHERE pq.product_id = lines.product_id
+          AND pq.quanity >= lines.quantity
+        RETURNING pq.product_id
+    ), items AS (
+        INSERT INTO order_items (order_id, product_id, creator_id, qty, unit_price)
+        SELECT CAST(:order_id AS bigint), product_id, creator_id, quantity, price
+        FROM lines
+    ), sales AS (
+        SELECT creator_id, sum(price * quantity) AS revenue
+        FROM lines
+        GROUP BY creator_id
+    ), ledger AS (
+        INSERT INTO business_ledger (business_id, order_id, revenue_cents, balance_cents, earnings_cents)
+        SELECT creator_id, CAST(:order_id AS bigint), revenue * 100, revenue * 98, revenue * 98
+        FROM sales
+    )
+    SELECT (SELECT count(*) FROM stock) AS settled,
+           (SELECT count(*) FROM cart) AS expected
+""")
+
+
+DROP_CART_ITEM_QUERY = text("""
+    WITH removed AS (
+        DELETE FROM cart_items
+        WHERE user_id = CAST(:user_id AS bigint)
+          AND product_id = CAST(:product_id AS bigint)
+          AND quantity <= CAST(:quantity AS integer)
+        RETURNING product_id
+    ), decremented AS (
+        UPDATE cart_items
+        SET quantity = quantity - CAST(:quantity AS integer)
+        WHERE user_id = CAST(:user_id AS bigint)
+          AND product_id = CAST(:product_id AS bigint)
+          AND quantity > CAST(:quantity AS integer)
+        RETURNING product_id
+    )
+    SELECT (SELECT count(*) FROM removed) + (SELECT count(*) FROM decremented)
+""")
+
+# Применение пачки дельт из буфера корзин: положительные добавляются upsert'ом,
+# отрицательные уменьшают количество или удаляют строку. Дельты для удалённых
+# товаров и несуществующих корзин, а также выводящие количество за :max_quantity,
+# отбрасываются по одной, чтобы не ронять всю пачку (и не повторять её бесконечно)
+APPLY_CART_DELTAS_QUERY = text("""
+    WITH deltas AS (
+        SELECT d.user_id, d.product_id, d.delta
+        FROM unnest(CAST(:user_ids AS bigint[]), CAST(:product_ids AS bigint[]), CAST(:deltas AS bigint[]))
+                 AS d(user_id, product_id, delta)
+                 JOIN users_cart uc ON uc.user_id = d.user_id
+                 JOIN products p ON p.id = d.product_id
+        WHERE abs(d.delta) <= CAST(:max_quantity AS bigint)
+    ), added AS (
+        INSERT INTO cart_items (user_id, product_id, quantity)
+        SELECT user_id, product_id, CAST(delta AS integer)
+        FROM deltas
+        WHERE delta > 0
+        ON CONFLICT (user_id, product_id) DO UPDATE
+            SET quantity = cart_items.quantity + excluded.quantity
+            WHERE cart_items.quantity + excluded.quantity <= CAST(:max_quantity AS integer)
+    ), decremented AS (
+        UPDATE cart_items ci
+        SET quantity = ci.quantity + d.delta
+        FROM deltas d
+        WHERE ci.user_id = d.user_id
+          AND ci.product_id = d.product_id
+          AND d.delta < 0
+          AND ci.quantity + d.delta > 0
+    )
+    DELETE FROM cart_items ci
+    USING deltas d
+    WHERE ci.user_id = d.user_id
+      AND ci.product_id = d.product_id
+      AND d.delta < 0
+      AND ci.quantity + d.delta <= 0
+""")
+
+# Захват ключа идемпотентности: новая строка или перехват незавершённой,
+# чья аренда истекла (первый запрос упал, не записав ответ)
+CLAIM_IDEMPOTENCY_KEY_QUERY = text("""
+    INSERT INTO idempotency_keys (user_id, scope, key, created_at)
+    VALUES (CAST(:user_id AS bigint), :scope, :key, now())
+    ON CONFLICT (user_id, scope, key) DO UPDATE
+        SET created_at = now()
+    WHERE idempotency_keys.status_code IS NULL
+      AND idempotency_keys.created_at < now() - make_interval(secs => CAST(:lease AS integer))
+    RETURNING key
+""")
+
+# История заказов покупателя одним запросом: дата, цена и позиции с названиями товаров.
+# Страницы по ключу orders.id в обратном порядке, индекс orders (creator_id, id)
+ORDER_HISTORY_QUERY = text("""
+    SELECT o.id AS order_id,
+           o.status,
+           o.is_canceled,
+           od.start_date,
+           od.end_date,
+           op.price,
+           coalesce(items.items, '[]') AS items
+    FROM orders o
+             LEFT JOIN order_date od ON od.order_id = o.id
+             LEFT JOIN order_price op ON op.order_id = o.id
+             LEFT JOIN LATERAL (
+        SELECT json_agg(
+                       json_build_object(
+                               'product_id', oi.product_id,
+                               'name', p.name,
+                               'quantity', oi.qty,
+                               'unit_price', oi.unit_price)
+                       ORDER BY oi.product_id) AS items
+        FROM order_items oi
+                 JOIN products p ON p.id = oi.product_id
+        WHERE oi.order_id = o.id
+        ) items ON true
+    WHERE o.creator_id = CAST(:user_id AS bigint)
+      AND o.is_deleted = false
+      AND o.id < CAST(:after_id AS bigint)
+    ORDER BY o.id DESC
+    LIMIT CAST(:limit AS integer)
+""")
+
+# Проверка корзины за один запрос: сумма, баланс и первый товар, которого не хватает.
+# Недоступный к продаже товар считается отсутствующим на складе. Цена берётся из products,
+# как и при зачислении продавцам, и передаётся в SETTLE_CART_QUERY
+VALIDATE_CART_TEMPLATE = """
+    WITH user_cart AS (
+        SELECT user_id
+        FROM users_cart
+        WHERE user_id = CAST(:user_id AS bigint)
+        {lock}
+    ), cart AS (
+        SELECT product_id, quantity
+        FROM cart_items
+        WHERE user_id = CAST(:user_id AS bigint)
+        ORDER BY product_id
+        {lock}
+    ), stock AS (
+        SELECT product_id, quanity
+        FROM product_quanity
+        WHERE product_id IN (SELECT product_id FROM cart)
+        ORDER BY product_id
+        {lock}
+    ), lines AS (
+        SELECT cart.product_id, cart.quantity, p.price,
+               CASE WHEN sp.product_id IS NULL THEN 0 ELSE coalesce(stock.quanity, 0) END AS available
+        FROM cart
+                 LEFT JOIN stock ON stock.product_id = cart.product_id
+                 LEFT JOIN products p ON p.id = cart.product_id
+                 LEFT JOIN sellable_products sp ON sp.product_id = cart.product_id
+    )
+    SELECT (SELECT array_agg(product_id ORDER BY product_id) FROM lines) AS product_ids,
+           (SELECT array_agg(quantity ORDER BY product_id) FROM lines) AS quantities,
+           (SELECT array_agg(price ORDER BY product_id) FROM lines) AS prices,
+           (SELECT coalesce(sum(price * quantity), 0) FROM lines) AS total_price,
+           (SELECT balance FROM users_balance WHERE user_id = CAST(:user_id AS bigint)) AS balance,
+           short.product_id,
+           short.shortfall
+    FROM user_cart uc
+             LEFT JOIN LATERAL (
+        SELECT product_id, quantity - available AS shortfall
+        FROM lines
+        WHERE available < quantity
+        ORDER BY product_id
+        LIMIT 1
+        ) short ON true
+"""
+VALIDATE_CART_QUERY = text(VALIDATE_CART_TEMPLATE.format(lock=''))
+VALIDATE_CART_FOR_UPDATE_QUERY = text(VALIDATE_CART_TEMPLATE.format(lock='FOR UPDATE'))
+
+
+def _checkout_rejection(validation: CartValidation | None) -> CheckoutResult | None:
+    if not validation:
+        return CheckoutResult(status='user_not_found')
+    if not validation.product_ids:
+        return CheckoutResult(status='cart_empty')
+    if validation.product_id:
+        return CheckoutResult(
+            status='insufficient_stock',
+            product_id=validation.product_id,
+            shortfall=validation.shortfall)
+    if validation.balance is None or validation.balance < validation.total_price:
+        return CheckoutResult(
+            status='insufficient_balance',
+            shortfall=validation.total_price - (validation.balance or 0))
+    return None
 
 
 class UsersDB:
@@ -24,21 +234,20 @@ class UsersDB:
             user_id: int
     ) -> List[ProductCartInfo]:
         result = await session.execute(
-            select(UsersCart)
-            .where(UsersCart.user_id == int(user_id)))
-        products_ids = result.scalar()
-        if not products_ids.shopping_cart:
+            select(CartItem.product_id, CartItem.quantity)
+            .where(CartItem.user_id == int(user_id))
+            .order_by(CartItem.product_id))
+        cart = cart_buffer.merge(
+            int(user_id),
+            {row.product_id: row.quantity for row in result.all()})
+        if not cart:
             return None
-        cart = Counter(products_ids.shopping_cart)
-        serialized_cart = []
-        for product_id, count in cart.items():
-            product_data = await ProductBusinessDB.get_product(id=product_id, session=session)
-            if product_data:
-                serialized_cart.append(
-                    ProductCartInfo(
-                        product_data=product_data,
-                        quantity=count))
-        return serialized_cart
+        products = await ProductBusinessDB.get_products(ids=list(cart), session=session)
+        return [
+            ProductCartInfo(
+                product_data=product_data,
+                quantity=cart[product_data.product_id])
+            for product_data in products]
 
     @staticmethod
     @logger.catch
@@ -46,10 +255,12 @@ class UsersDB:
             session: AsyncSession,
             user_id: int
     ) -> None:
+        if settings.cart_buffer.ENABLED:
+            await cart_buffer.clear(int(user_id))
+            return
         await session.execute(
-            update(UsersCart)
-            .values(shopping_cart=[])
-            .where(UsersCart.user_id == int(user_id)))
+            delete(CartItem)
+            .where(CartItem.user_id == int(user_id)))
         await session.commit()
 
     @staticmethod
@@ -58,24 +269,27 @@ class UsersDB:
             user_id: int,
             product_id: int,
             session: AsyncSession,
+            quantity: int = 1,
     ) -> bool:
+        if settings.cart_buffer.ENABLED:
+            result = await session.execute(
+                select(CartItem.product_id, CartItem.quantity)
+                .where(CartItem.user_id == int(user_id),
+                       CartItem.product_id == product_id))
+            in_cart = cart_buffer.merge(
+                int(user_id),
+                {row.product_id: row.quantity for row in result.all()}).get(product_id)
+            if not in_cart:
+                return False
+            await cart_buffer.remove(int(user_id), product_id, min(quantity, in_cart))
+            return True
+        # Строка удаляется, если убирают всё количество, иначе уменьшается
         result = await session.execute(
-            select(UsersCart)
-            .where(UsersCart.user_id == int(user_id)))
-        user = result.scalar()
-        if not user or not user.shopping_cart:
-            return False
-        try:
-            updated_cart = user.shopping_cart.copy()
-            updated_cart.remove(product_id)
-        except ValueError:
-            return False
-        await session.execute(
-            update(UsersCart)
-            .where(UsersCart.user_id == int(user_id))
-            .values(shopping_cart=updated_cart))
+            DROP_CART_ITEM_QUERY,
+            {'user_id': int(user_id), 'product_id': product_id, 'quantity': quantity})
+        changed = result.scalar()
         await session.commit()
-        return True
+        return bool(changed)
 
     @staticmethod
     @logger.catch
@@ -83,111 +297,305 @@ class UsersDB:
             product_id: int,
             user_id: int,
             session: AsyncSession,
-    ) -> None:
-        await session.execute(
-            update(UsersCart)
-            .where(UsersCart.user_id == int(user_id))
-            .values(
-                shopping_cart=(
-                        func.coalesce(
-                            UsersCart.shopping_cart,
-                            cast(array([], type_=ARRAY(Integer)), ARRAY(Integer))
-                        ) + array([product_id]))))
-        await session.commit()
+            quantity: int = 1,
+    ) -> str:
+        # 'added', 'product_not_found' или 'quantity_limit'
+        if settings.cart_buffer.ENABLED:
+            product_result = await session.execute(
+                select(Product.id, CartItem.quantity)
+                .outerjoin(CartItem, and_(CartItem.product_id == Product.id,
+                                          CartItem.user_id == int(user_id)))
+                .where(Product.id == product_id))
+            product = product_result.first()
+            if not product:
+                return 'product_not_found'
+            if not await cart_buffer.add(int(user_id), product_id, quantity,
+                                         stored=product.quantity or 0,
+                                         limit=settings.cart.MAX_ITEM_QUANTITY):
+                return 'quantity_limit'
+            return 'added'
+        try:
+            # Сумма с уже лежащим в корзине не должна превысить предел
+            result = await session.execute(
+                insert(CartItem)
+                .values(user_id=int(user_id), product_id=product_id, quantity=quantity)
+                .on_conflict_do_update(
+                    index_elements=[CartItem.user_id, CartItem.product_id],
+                    set_={'quantity': CartItem.quantity + quantity},
+                    where=CartItem.quantity + quantity <= settings.cart.MAX_ITEM_QUANTITY)
+                .returning(CartItem.quantity))
+            added = result.first()
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            return 'product_not_found'
+        return 'added' if added else 'quantity_limit'
 
     @staticmethod
-    @logger.catch
-    async def check_cart(
-            user_id: int,
+    async def apply_cart_mutations(
             session: AsyncSession,
-    ) -> bool | None:
-        user_cart_result = await session.execute(
-            select(UsersCart)
-            .where(UsersCart.user_id == int(user_id)))
-        user_cart = user_cart_result.scalar()
-        if not user_cart:
-            return None
-        if not user_cart.shopping_cart:
+            cleared_user_ids: List[int],
+            rows: List[tuple],
+            seq: int,
+    ) -> bool:
+        # Пачка и отметка seq фиксируются одной транзакцией
+        try:
+            if cleared_user_ids:
+                await session.execute(
+                    delete(CartItem)
+                    .where(CartItem.user_id.in_(cleared_user_ids)))
+            if rows:
+                user_ids, product_ids, deltas = (list(column) for column in zip(*rows))
+                await session.execute(
+                    APPLY_CART_DELTAS_QUERY,
+                    {'user_ids': user_ids, 'product_ids': product_ids, 'deltas': deltas,
+                     'max_quantity': settings.cart.MAX_ITEM_QUANTITY})
+            await session.execute(
+                insert(CartBufferCheckpoint)
+                .values(node_id=cart_buffer.node_id, seq=seq)
+                .on_conflict_do_update(
+                    index_elements=[CartBufferCheckpoint.node_id],
+                    set_={'seq': seq}))
+            await session.commit()
+        except SQLAlchemyError:
+            logger.exception('Cart buffer flush failed')
+            await session.rollback()
             return False
         return True
 
     @staticmethod
-    @logger.catch
-    async def check_balance(
+    @logger.catch(exclude=CartFlushError)
+    async def flush_cart_buffer(
             session: AsyncSession,
-            user_id: int,
-            cart: list[ProductCartInfo],
-    ) -> bool:
-        cart_price = 0
-        if not cart:
-            return False
-        for product in cart:
-            cart_price += product.product_data.price*product.quantity
+    ) -> int:
+        return await cart_buffer.flush(partial(UsersDB.apply_cart_mutations, session))
 
-        balance = await ProfileUsersDB.get_balance(session=session, user_id=user_id)
-        if cart_price > balance:
-            return False
-        return int(cart_price)
+    @staticmethod
+    @logger.catch(exclude=JournalInUse)
+    async def recover_cart_buffer(
+            session: AsyncSession,
+    ) -> int:
+        result = await session.execute(
+            select(CartBufferCheckpoint.seq)
+            .where(CartBufferCheckpoint.node_id == cart_buffer.node_id))
+        return await cart_buffer.recover(checkpoint=result.scalar() or 0)
 
     @staticmethod
     @logger.catch
-    async def register_order(
+    async def validate_cart(
             session: AsyncSession,
             user_id: int,
-            cart_price: int,
-    ) -> int:
-        order_insert_result = await session.execute(
-            insert(Order)
-            .values(
-                creator_id=user_id,
-                is_canceled=False,
-                is_deleted=False)
-            .returning(Order.id))
-        order_id = order_insert_result.scalar()
-        cart_result = await session.execute(
-            select(UsersCart.shopping_cart)
-            .where(UsersCart.user_id == int(user_id)))
-        cart = cart_result.scalar()
-        order_data = [
+            lock: bool = False,
+    ) -> CartValidation | None:
+        result = await session.execute(
+            VALIDATE_CART_FOR_UPDATE_QUERY if lock else VALIDATE_CART_QUERY,
+            {'user_id': int(user_id)})
+        validation = result.mappings().first()
+        if not validation:
+            return None
+        return CartValidation(**validation)
+
+    @staticmethod
+    @logger.catch(exclude=CartFlushError)
+    async def checkout(
+            session: AsyncSession,
+            user_id: int,
+            order_id: int | None = None,
+    ) -> CheckoutResult:
+        # Вся покупка - одна короткая транзакция. Корзина и остатки блокируются
+        # проверочным запросом, остатки и баланс списываются только если их хватает
+        # Заказ из очереди уже прошёл сброс буфера корзин при постановке.
+        # Если буфер не записался, CartFlushError прерывает покупку: иначе она прошла бы
+        # по устаревшей корзине из базы
+        if settings.cart_buffer.ENABLED and order_id is None:
+            await UsersDB.flush_cart_buffer(session=session)
+        validation = await UsersDB.validate_cart(session=session, user_id=user_id, lock=True)
+        rejection = _checkout_rejection(validation)
+        if rejection:
+            await session.rollback()
+            return rejection
+        cart_price = validation.total_price
+
+        balance_result = await session.execute(
+            update(UsersBalance)
+            .where(UsersBalance.user_id == int(user_id),
+                   UsersBalance.balance >= cart_price)
+            .values(balance=UsersBalance.balance - cart_price)
+            .returning(UsersBalance.balance))
+        if not balance_result.first():
+            await session.rollback()
+            return CheckoutResult(
+                status='insufficient_balance',
+                shortfall=cart_price - (validation.balance or 0))
+
+        if order_id is None:
+            order_insert_result = await session.execute(
+                insert(Order)
+                .values(
+                    creator_id=int(user_id),
+                    is_canceled=False,
+                    is_deleted=False,
+                    status='created')
+                .returning(Order.id))
+            order_id = order_insert_result.scalar()
+        else:
+            # Заказ из очереди уже создан в статусе pending
+            await session.execute(
+                update(Order)
+                .where(Order.id == order_id)
+                .values(status='created', status_detail=None))
+        settle_result = await session.execute(
+            SETTLE_CART_QUERY,
+            {'product_ids': validation.product_ids,
+             'quantities': validation.quantities,
+             'prices': validation.prices,
+             'order_id': order_id})
+        settled = settle_result.first()
+        if settled.settled != settled.expected:
+            # Остаток не списан хотя бы по одной позиции - заказ не создаётся
+            await session.rollback()
+            return CheckoutResult(status='insufficient_stock')
+        session.add_all([
             OrderDate(
                 order_id=order_id,
                 start_date=datetime.utcnow()),
             OrderCart(
                 order_id=order_id,
-                shopping_cart=cart),
+                shopping_cart=[
+                    product_id
+                    for product_id, quantity in zip(validation.product_ids, validation.quantities)
+                    for _ in range(quantity)]),
             OrderPrice(
                 order_id=order_id,
-                price=cart_price)
-        ]
-        session.add_all(order_data)
+                price=cart_price)])
+        # Удаляются только прочитанные позиции: товар, добавленный параллельно, останется в корзине
         await session.execute(
-            update(UsersCart)
-            .where(UsersCart.user_id == int(user_id))
-            .values(shopping_cart=[]))
-        await session.execute(
-            update(UsersBalance)
-            .where(UsersBalance.user_id == int(user_id))
-            .values(balance=coalesce(UsersBalance.balance, 0) - int(cart_price))
-        )
-        for id in cart:
-            await session.execute(
-                update(ProductQuanity)
-                .where(ProductQuanity.product_id == id)
-                .values(quanity=coalesce(ProductQuanity.quanity, 0) - 1))
-            result = await session.execute(
-                select(Product)
-                .where(Product.id==id))
-            product = result.scalar()
-            await session.execute(
-                update(BusinessFinance)
-                .values(
-                    revenue=coalesce(BusinessFinance.revenue, 0) + product.price,
-                    balance=coalesce(BusinessFinance.balance, 0)+(product.price*0.98),
-                    earnings=coalesce(BusinessFinance.earnings, 0)+(product.price*0.98))
-                .where(BusinessFinance.business_id==product.creator_id))
+            delete(CartItem)
+            .where(CartItem.user_id == int(user_id),
+                   CartItem.product_id.in_(validation.product_ids)))
+        await session.commit()
+        product_cache.invalidate(validation.product_ids)
+        return CheckoutResult(status='created', order_id=order_id)
+
+    @staticmethod
+    @logger.catch(exclude=CartFlushError)
+    async def precheck_cart(
+            session: AsyncSession,
+            user_id: int,
+    ) -> CheckoutResult | None:
+        # Проверка без блокировок перед постановкой заказа в очередь
+        if settings.cart_buffer.ENABLED:
+            await UsersDB.flush_cart_buffer(session=session)
+        validation = await UsersDB.validate_cart(session=session, user_id=user_id)
+        await session.rollback()
+        return _checkout_rejection(validation)
+
+    @staticmethod
+    @logger.catch
+    async def create_pending_order(
+            session: AsyncSession,
+            user_id: int,
+    ) -> int:
+        result = await session.execute(
+            insert(Order)
+            .values(
+                creator_id=int(user_id),
+                is_canceled=False,
+                is_deleted=False,
+                status='pending')
+            .returning(Order.id))
+        order_id = result.scalar()
         await session.commit()
         return order_id
 
+    @staticmethod
+    @logger.catch
+    async def lock_pending_order(
+            session: AsyncSession,
+            order_id: int,
+    ) -> bool:
+        # Блокировка держится до конца транзакции оформления: один заказ,
+        # попавший в очереди двух процессов, будет проведён только один раз
+        result = await session.execute(
+            select(Order.id)
+            .where(Order.id == order_id,
+                   Order.status == 'pending')
+            .with_for_update())
+        if not result.first():
+            await session.rollback()
+            return False
+        return True
+
+    @staticmethod
+    @logger.catch
+    async def fail_order(
+            session: AsyncSession,
+            order_id: int,
+            result: CheckoutResult | None,
+    ) -> None:
+        await session.execute(
+            update(Order)
+            .where(Order.id == order_id,
+                   Order.status == 'pending')
+            .values(
+                status=result.status if result else 'failed',
+                status_detail=result.model_dump(include={'product_id', 'shortfall'}) if result else None,
+                is_canceled=True))
+        await session.commit()
+
+    @staticmethod
+    @logger.catch
+    async def get_order_status(
+            session: AsyncSession,
+            user_id: int,
+            order_id: int,
+    ) -> OrderStatusScheme | None:
+        result = await session.execute(
+            select(Order.id, Order.status, Order.status_detail)
+            .where(Order.id == order_id,
+                   Order.creator_id == int(user_id)))
+        row = result.first()
+        if not row:
+            return None
+        return OrderStatusScheme(order_id=row.id, status=row.status, detail=row.status_detail)
+
+    @staticmethod
+    @logger.catch
+    async def get_pending_orders(
+            session: AsyncSession,
+            limit: int,
+            exclude: List[int],
+    ):
+        result = await session.execute(
+            select(Order.id, Order.creator_id)
+            .where(Order.status == 'pending',
+                   Order.id.not_in(exclude))
+            .order_by(Order.id)
+            .limit(limit))
+        return result.all()
+
+    @staticmethod
+    @logger.catch
+    async def get_order_history(
+            session: AsyncSession,
+            user_id: int,
+            limit: int,
+            after: dict | None = None,
+    ) -> OrderHistoryPageScheme:
+        result = await session.execute(
+            ORDER_HISTORY_QUERY,
+            {'user_id': int(user_id),
+             'after_id': after['id'] if after else 2 ** 63 - 1,
+             'limit': limit + 1})
+        orders = result.mappings().all()
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor({'user_id': int(user_id), 'id': orders[-1]['order_id']})
+        return OrderHistoryPageScheme(
+            orders=[OrderHistoryScheme(**order) for order in orders],
+            next_cursor=next_cursor)
+
     @staticmethod
     @logger.catch
     async def get_active_orders(
@@ -207,20 +615,6 @@ class UsersDB:
         order_result = await session.execute(query, { 'user_id': user_id })
         return order_result.mappings().all()
 
-    @staticmethod
-    @logger.catch
-    async def check_quanity(
-            session: AsyncSession,
-            cart: list[ProductCartInfo]
-    ) -> bool:
-        for product in cart:
-            result = await session.execute(
-                select(ProductQuanity)
-                .where(ProductQuanity.product_id == product.product_data.product_id))
-            db_product = result.scalar()
-            if db_product.quanity < product.quantity:
-                return [product.product_data.product_id, product.quantity - db_product.quanity]
-        return True
 
 class BusinessDB:
 
@@ -230,26 +624,126 @@ class BusinessDB:
             session: AsyncSession,
             business_id: int
     ):
+        # shopping_cart - прежний формат ответа (id товара повторяется по количеству),
+        # items - позиции с количеством и ценой. Удалённые товары не показываются
         query = text("""
             SELECT
-                order_id,
-                filtered_cart AS shopping_cart
-            FROM (
-                SELECT
-                    order_id,
-                    ARRAY(
-                        SELECT p.id
-                        FROM unnest(shopping_cart) AS product_id
-                        JOIN products p ON p.id = product_id
-                        WHERE creator_id = :business_id AND is_deleted = false
-                    ) AS filtered_cart
-                FROM order_cart
-            ) sub
-            WHERE array_length(filtered_cart, 1) > 0; 
-        """) # Зубодробительный SQL-запрос
+                oi.order_id,
+                array_agg(oi.product_id ORDER BY oi.product_id) AS shopping_cart,
+                json_agg(
+                    json_build_object(
+                        'product_id', oi.product_id,
+                        'quantity', oi.qty,
+                        'unit_price', oi.unit_price)
+                    ORDER BY oi.product_id) FILTER (WHERE unit.n = 1) AS items
+            FROM order_items oi
+                JOIN orders o ON o.id = oi.order_id
+                JOIN products p ON p.id = oi.product_id
+                CROSS JOIN LATERAL generate_series(1, oi.qty) AS unit(n)
+                    WHERE oi.creator_id = :business_id
+                        AND p.is_deleted = false
+                        AND o.is_canceled = false
+                        AND o.is_deleted = false
+            GROUP BY oi.order_id
+            ORDER BY oi.order_id DESC;
+        """)
         result = await session.execute(query, {"business_id": business_id})
         return result.mappings().all()
 
 
+class IdempotencyDB:
 
+    @staticmethod
+    @logger.catch
+    async def claim(
+            session: AsyncSession,
+            user_id: int,
+            scope: str,
+            key: str,
+            lease: int,
+    ) -> bool:
+        result = await session.execute(
+            CLAIM_IDEMPOTENCY_KEY_QUERY,
+            {'user_id': user_id, 'scope': scope, 'key': key, 'lease': lease})
+        claimed = result.first()
+        await session.commit()
+        return bool(claimed)
+
+    @staticmethod
+    @logger.catch
+    async def get_response(
+            session: AsyncSession,
+            user_id: int,
+            scope: str,
+            key: str,
+    ):
+        result = await session.execute(
+            select(IdempotencyKey.status_code, IdempotencyKey.response)
+            .where(IdempotencyKey.user_id == user_id,
+                   IdempotencyKey.scope == scope,
+                   IdempotencyKey.key == key,
+                   IdempotencyKey.status_code.is_not(None)))
+        return result.first()
+
+    @staticmethod
+    @logger.catch
+    async def save_response(
+            session: AsyncSession,
+            user_id: int,
+            scope: str,
+            key: str,
+            status_code: int,
+            response,
+    ) -> None:
+        await session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id,
+                   IdempotencyKey.scope == scope,
+                   IdempotencyKey.key == key)
+            .values(status_code=status_code, response=response))
+        await session.commit()
+
+    @staticmethod
+    @logger.catch
+    async def extend_lease(
+            session: AsyncSession,
+            user_id: int,
+            scope: str,
+            key: str,
+    ) -> None:
+        await session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id,
+                   IdempotencyKey.scope == scope,
+                   IdempotencyKey.key == key,
+                   IdempotencyKey.status_code.is_(None))
+            .values(created_at=func.now()))
+        await session.commit()
+
+    @staticmethod
+    @logger.catch
+    async def release(
+            session: AsyncSession,
+            user_id: int,
+            scope: str,
+            key: str,
+    ) -> None:
+        await session.execute(
+            delete(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id,
+                   IdempotencyKey.scope == scope,
+                   IdempotencyKey.key == key,
+                   IdempotencyKey.status_code.is_(None)))
+        await session.commit()
 
+    @staticmethod
+    @logger.catch
+    async def delete_expired(
+            session: AsyncSession,
+            ttl: int,
+    ) -> int:
+        result = await session.execute(
+            delete(IdempotencyKey)
+            .where(IdempotencyKey.created_at < func.now() - timedelta(seconds=ttl)))
+        await session.commit()
+        return result.rowcount
@@ -0,0 +1,88 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from backend.src.db_core.helper import db_helper
+from backend.src.global_config import settings
+from backend.src.orders.db import IdempotencyDB
+
+
+async def _keep_lease(user_id: int, scope: str, key: str) -> None:
+    # Пока обработчик работает, аренда продлевается: повтор с тем же ключом не перехватит
+    # ключ у медленного, но живого запроса (например, ждущего блокировок строк)
+    while True:
+        await asyncio.sleep(settings.idempotency.LEASE / 3)
+        async with db_helper.session_factory() as session:
+            await IdempotencyDB.extend_lease(session=session, user_id=user_id, scope=scope, key=key)
+
+
+async def _run_with_lease(
+        user_id: int,
+        scope: str,
+        key: str,
+        handler: Callable[[], Awaitable[Any]],
+) -> Any:
+    heartbeat = asyncio.create_task(_keep_lease(user_id, scope, key))
+    try:
+        return await handler()
+    finally:
+        heartbeat.cancel()
+
+
+async def run_idempotent(
+        key: str | None,
+        user_id: int,
+        scope: str,
+        handler: Callable[[], Awaitable[Any]],
+) -> Response:
+    # Первый запрос с ключом выполняет обработчик и сохраняет ответ,
+    # повторы ждут этот ответ и возвращают его, не выполняя обработчик снова
+    if not key:
+        return await handler()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.idempotency.WAIT
+    while True:
+        async with db_helper.session_factory() as session:
+            if await IdempotencyDB.claim(session=session, user_id=user_id, scope=scope,
+                                         key=key, lease=settings.idempotency.LEASE):
+                break
+            stored = await IdempotencyDB.get_response(session=session, user_id=user_id,
+                                                      scope=scope, key=key)
+        if stored:
+            return JSONResponse(
+                status_code=stored.status_code,
+                content=stored.response,
+                headers={'Idempotent-Replayed': 'true'})
+        if loop.time() > deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail='Request with this Idempotency-Key is in progress')
+        await asyncio.sleep(settings.idempotency.POLL_INTERVAL)
+
+    try:
+        response = await _run_with_lease(user_id, scope, key, handler)
+    except HTTPException as error:
+        # Ошибки клиента сохраняются как ответ, серверные - освобождают ключ для повтора
+        async with db_helper.session_factory() as session:
+            if error.status_code < 500:
+                await IdempotencyDB.save_response(
+                    session=session, user_id=user_id, scope=scope, key=key,
+                    status_code=error.status_code, response={'detail': error.detail})
+            else:
+                await IdempotencyDB.release(session=session, user_id=user_id, scope=scope, key=key)
+        raise
+    except Exception:
+        async with db_helper.session_factory() as session:
+            await IdempotencyDB.release(session=session, user_id=user_id, scope=scope, key=key)
+        raise
+    if not isinstance(response, Response):
+        response = JSONResponse(content=jsonable_encoder(response))
+    async with db_helper.session_factory() as session:
+        await IdempotencyDB.save_response(
+            session=session, user_id=user_id, scope=scope, key=key,
+            status_code=response.status_code, response=json.loads(response.body))
+    return response
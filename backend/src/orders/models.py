@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import List, Literal, Any
+
 from pydantic import BaseModel
 
 from backend.src.products.models import ProductGetScheme
@@ -6,3 +9,49 @@ from backend.src.products.models import ProductGetScheme
 class ProductCartInfo(BaseModel):
     product_data: ProductGetScheme
     quantity: int
+
+
+class CheckoutResult(BaseModel):
+    status: Literal['created', 'user_not_found', 'cart_empty', 'insufficient_stock', 'insufficient_balance',
+                    'failed']
+    order_id: int | None = None
+    product_id: int | None = None
+    shortfall: int | None = None
+
+
+class CartValidation(BaseModel):
+    product_ids: List[int] | None = None
+    quantities: List[int] | None = None
+    prices: List[int] | None = None
+    total_price: int
+    balance: int | None = None
+    product_id: int | None = None
+    shortfall: int | None = None
+
+
+class OrderStatusScheme(BaseModel):
+    order_id: int
+    status: str
+    detail: dict[str, Any] | None = None
+
+
+class OrderItemScheme(BaseModel):
+    product_id: int
+    name: str
+    quantity: int
+    unit_price: int
+
+
+class OrderHistoryScheme(BaseModel):
+    order_id: int
+    status: str
+    is_canceled: bool
+    start_date: datetime | None = None
+    end_date: datetime | None = None
+    price: int | None = None
+    items: List[OrderItemScheme]
+
+
+class OrderHistoryPageScheme(BaseModel):
+    orders: List[OrderHistoryScheme]
+    next_cursor: str | None = None
@@ -1,12 +1,19 @@
+import asyncio
+from functools import partial
+
 from authx import TokenPayload
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.src.db_core.helper import db_helper
 from backend.src.global_config import settings
 from backend.src.global_dependencies import get_payload_by_access_token
+from backend.src.orders.checkout_queue import checkout_queue
 from backend.src.orders.db import UsersDB, BusinessDB
+from backend.src.orders.idempotency import run_idempotent
+from backend.src.orders.models import CheckoutResult, OrderStatusScheme, OrderHistoryPageScheme
+from backend.src.products.utils import decode_cursor
 
 router = APIRouter(
     tags=['orders'],
@@ -31,45 +38,87 @@ async def get_user_cart(
     return user_cart
 
 
+async def drop_cart(session: AsyncSession, user_id: int) -> dict:
+    await UsersDB.drop_cart_items(session=session, user_id=user_id, )
+    return {'status': 'ok'}
+
+
 @router.delete('/user/cart')
 async def drop_user_cart(
+        idempotency_key: str | None = Header(None, alias='Idempotency-Key', max_length=255),
         token_payload: TokenPayload = Depends(get_payload_by_access_token),
         session: AsyncSession = Depends(db_helper.get_async_session)
 ) -> JSONResponse:
     if token_payload.role != 'user':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
-    await UsersDB.drop_cart_items(session=session, user_id=token_payload.uid, )
+    return await run_idempotent(
+        key=idempotency_key,
+        user_id=int(token_payload.uid),
+        scope='cart_drop',
+        handler=partial(drop_cart, session=session, user_id=int(token_payload.uid)))
+
+
+async def drop_cart_item(session: AsyncSession, user_id: int, product_id: int, quantity: int) -> dict:
+    if not await UsersDB.drop_cart_item(session=session,
+                                        user_id=user_id,
+                                        product_id=product_id,
+                                        quantity=quantity):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='Item not in cart')
     return {'status': 'ok'}
 
 
 @router.post('/user/cart/{product_id}/delete')
 async def drop_item_in_cart(
         product_id: int,
+        quantity: int = Query(1, ge=1, le=settings.cart.MAX_ITEM_QUANTITY),
+        idempotency_key: str | None = Header(None, alias='Idempotency-Key', max_length=255),
         token_payload: TokenPayload = Depends(get_payload_by_access_token),
         session: AsyncSession = Depends(db_helper.get_async_session)
 ) -> JSONResponse:
     if token_payload.role != 'user':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
-    if not await UsersDB.drop_cart_item(session=session,
-                                        user_id=token_payload.uid,
-                                        product_id=product_id):
+    return await run_idempotent(
+        key=idempotency_key,
+        user_id=int(token_payload.uid),
+        scope=f'cart_delete:{product_id}:{quantity}',
+        handler=partial(drop_cart_item, session=session, user_id=int(token_payload.uid),
+                        product_id=product_id, quantity=quantity))
+
+
+async def add_cart_item(session: AsyncSession, user_id: int, product_id: int, quantity: int) -> dict:
+    result = await UsersDB.add_cart_item(session=session, product_id=product_id,
+                                         user_id=user_id, quantity=quantity)
+    if not result:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if result == 'product_not_found':
         raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail='Item not in cart')
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Product not found')
+    if result == 'quantity_limit':
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f'Cart quantity is limited to {settings.cart.MAX_ITEM_QUANTITY}')
     return {'status': 'ok'}
 
 
 @router.post('/user/cart/{product_id}/add')
 async def add_item_to_cart(
         product_id: int,
+        quantity: int = Query(1, ge=1, le=settings.cart.MAX_ITEM_QUANTITY),
+        idempotency_key: str | None = Header(None, alias='Idempotency-Key', max_length=255),
         token_payload: TokenPayload = Depends(get_payload_by_access_token),
         session: AsyncSession = Depends(db_helper.get_async_session)
 ) -> JSONResponse:
     if token_payload.role != 'user':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
-    await UsersDB.add_cart_item(session=session, product_id=product_id,
-                                user_id=token_payload.uid)
-    return {'status': 'ok'}
+    return await run_idempotent(
+        key=idempotency_key,
+        user_id=int(token_payload.uid),
+        scope=f'cart_add:{product_id}:{quantity}',
+        handler=partial(add_cart_item, session=session, user_id=int(token_payload.uid),
+                        product_id=product_id, quantity=quantity))
 
 @router.get('/user/order/active')
 async def get_user_orders(
@@ -87,46 +136,141 @@ async def get_user_orders(
             detail='No active orders')
     return active_orders
 
+def raise_for_checkout(result: CheckoutResult | None) -> None:
+    if not result:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if result.status == 'user_not_found':
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='User doesn\'t exists')
+    if result.status == 'cart_empty':
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='Cart is empty')
+    if result.status == 'insufficient_stock':
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                'message': 'Available quanity smaller',
+                'product_id': result.product_id,
+                'quanity_different': result.shortfall})
+    if result.status == 'insufficient_balance':
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                'message': 'Cart price bigger than balance',
+                'balance_different': result.shortfall})
+
+
+async def checkout(session: AsyncSession, user_id: int) -> JSONResponse:
+    result = await UsersDB.checkout(session=session, user_id=user_id)
+    raise_for_checkout(result)
+    return JSONResponse(
+        status_code=status.HTTP_201_CREATED,
+        content={'order_id': result.order_id})
+
+
+async def enqueue_checkout(session: AsyncSession, user_id: int) -> JSONResponse:
+    # Запрос только проверяет корзину и ставит заказ в очередь, покупку проводит воркер
+    if checkout_queue.queue.full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Checkout queue is full',
+            headers={'Retry-After': str(settings.checkout_queue.RETRY_AFTER)})
+    rejection = await UsersDB.precheck_cart(session=session, user_id=user_id)
+    if rejection:
+        raise_for_checkout(rejection)
+    order_id = await UsersDB.create_pending_order(session=session, user_id=user_id)
+    if not order_id:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if not checkout_queue.submit(order_id, user_id):
+        await UsersDB.fail_order(session=session, order_id=order_id, result=None)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Checkout queue is full',
+            headers={'Retry-After': str(settings.checkout_queue.RETRY_AFTER)})
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={'order_id': order_id, 'status': 'pending'})
+
+
+@router.get('/user/order/history', response_model=OrderHistoryPageScheme)
+async def get_user_order_history(
+        cursor: str | None = None,
+        limit: int = Query(settings.pagination.DEFAULT_PAGE_SIZE, ge=1, le=settings.pagination.MAX_PAGE_SIZE),
+        token_payload: TokenPayload = Depends(get_payload_by_access_token),
+        session: AsyncSession = Depends(db_helper.get_async_session)
+) -> JSONResponse:
+    if token_payload.role != 'user':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after or after.get('user_id') != int(token_payload.uid):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail='Invalid cursor')
+    history = await UsersDB.get_order_history(
+        session=session,
+        user_id=int(token_payload.uid),
+        limit=limit,
+        after=after)
+    if not history:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return history
+
+
 @router.post('/user/order/begin')
 async def begin_order(
+        idempotency_key: str | None = Header(None, alias='Idempotency-Key', max_length=255),
         token_payload: TokenPayload = Depends(get_payload_by_access_token),
         session: AsyncSession = Depends(db_helper.get_async_session)
 ) -> JSONResponse:
     if token_payload.role != 'user':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail='Only users have shopping cart')
-    cart_state = await UsersDB.check_cart(
-        session=session,
-        user_id=int(token_payload.uid))
-    if cart_state is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail='User doesn\'t exists')
-    if cart_state is False:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail='Cart is empty')
-    if cart_state is True:
-        cart = await UsersDB.get_cart(session=session, user_id=int(token_payload.uid))
-        cart_price = await UsersDB.check_balance(session=session, user_id=int(token_payload.uid), cart=cart)
-        product_quanity = await UsersDB.check_quanity(session=session, cart=cart)
-
-        if product_quanity is not True:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail={
-                    'message': 'Available quanity smaller',
-                    'product_id': product_quanity[0],
-                    'quanity_different': product_quanity[1]})
-        if not cart_price:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail='Cart price bigger than balance')
-        order_id = await UsersDB.register_order(session=session, user_id=int(token_payload.uid), cart_price=cart_price)
-        if order_id:
-            return JSONResponse(
-                status_code=status.HTTP_201_CREATED,
-                content={'order_id': order_id})
+    # Повтор с тем же ключом вернёт сохранённый ответ, не трогая остатки и баланс
+    return await run_idempotent(
+        key=idempotency_key,
+        user_id=int(token_payload.uid),
+        scope='order_begin',
+        handler=partial(
+            enqueue_checkout if settings.checkout_queue.ENABLED else checkout,
+            session=session,
+            user_id=int(token_payload.uid)))
+
+
+@router.get('/user/order/{order_id}/status')
+async def get_order_status(
+        order_id: int,
+        wait: int = Query(0, ge=0),
+        token_payload: TokenPayload = Depends(get_payload_by_access_token),
+        session: AsyncSession = Depends(db_helper.get_async_session)
+) -> OrderStatusScheme:
+    if token_payload.role != 'user':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    # wait > 0 - long polling: ответ приходит, как только заказ перестал быть pending
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(wait, settings.checkout_queue.MAX_WAIT)
+    with checkout_queue.watch(order_id) as done:
+        while True:
+            done.clear()
+            order_status = await UsersDB.get_order_status(
+                session=session,
+                user_id=int(token_payload.uid),
+                order_id=order_id)
+            await session.rollback()
+            if not order_status:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail='Order not found')
+            remaining = deadline - loop.time()
+            if order_status.status != 'pending' or remaining <= 0:
+                return order_status
+            try:
+                await asyncio.wait_for(done.wait(), timeout=min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
 
 @router.get('/business/order/active')
 async def get_active_orders(
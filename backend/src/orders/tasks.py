@@ -0,0 +1,36 @@
+import asyncio
+
+from loguru import logger
+
+from backend.src.db_core.helper import db_helper
+from backend.src.orders.cart_buffer import CartFlushError
+from backend.src.orders.checkout_queue import checkout_queue
+from backend.src.orders.db import UsersDB, IdempotencyDB
+
+
+async def flush_cart_buffer(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        async with db_helper.session_factory() as session:
+            try:
+                await UsersDB.flush_cart_buffer(session=session)
+            except CartFlushError:
+                # Причина уже в логе, изменения ждут следующей попытки
+                pass
+
+
+async def delete_expired_idempotency_keys(interval: int, ttl: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        async with db_helper.session_factory() as session:
+            deleted = await IdempotencyDB.delete_expired(session=session, ttl=ttl)
+        if deleted:
+            logger.info(f'Expired idempotency keys removed: {deleted}')
+
+
+async def requeue_pending_orders(interval: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        requeued = await checkout_queue.recover()
+        if requeued:
+            logger.info(f'Pending orders requeued: {requeued}')
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Iterable
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.src.db_core.tables import Category
+from backend.src.global_config import settings
+from backend.src.products.models import CategoryModel, ProductGetScheme
+
+
+class CategoryCache:
+
+    def __init__(self, ttl: int) -> None:
+        self.ttl = ttl
+        self._categories: Dict[int, CategoryModel] = {}
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    @logger.catch
+    async def load(self, session: AsyncSession) -> None:
+        result = await session.execute(
+            select(Category)
+            .where(Category.is_deleted.is_(False))
+            .order_by(Category.id))
+        self._categories = {
+            category.id: CategoryModel(
+                category_id=category.id,
+                name=category.name,
+                description=category.description)
+            for category in result.scalars().all()}
+        self._loaded_at = time.monotonic()
+        logger.debug(f'Category cache loaded: {len(self._categories)} categories')
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    async def _refresh_if_stale(self, session: AsyncSession) -> None:
+        if not self._is_stale():
+            return
+        async with self._lock:
+            if self._is_stale():
+                await self.load(session)
+
+    async def get(self, session: AsyncSession, id: int) -> CategoryModel | None:
+        await self._refresh_if_stale(session)
+        return self._categories.get(id)
+
+    async def get_all(self, session: AsyncSession) -> List[CategoryModel]:
+        await self._refresh_if_stale(session)
+        return list(self._categories.values())
+
+    async def contains(self, session: AsyncSession, id: int) -> bool:
+        await self._refresh_if_stale(session)
+        return id in self._categories
+
+
+class ProductCache:
+
+    def __init__(self, max_size: int, ttl: int) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._products: OrderedDict[int, tuple[float, ProductGetScheme]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, id: int) -> ProductGetScheme | None:
+        entry = self._products.get(id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, product = entry
+        if time.monotonic() >= expires_at:
+            del self._products[id]
+            self.misses += 1
+            return None
+        self._products.move_to_end(id)
+        self.hits += 1
+        return product
+
+    def put(self, product: ProductGetScheme) -> None:
+        if self.max_size <= 0:
+            return
+        self._products[product.product_id] = (time.monotonic() + self.ttl, product)
+        self._products.move_to_end(product.product_id)
+        while len(self._products) > self.max_size:
+            self._products.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, ids: Iterable[int]) -> None:
+        for id in ids:
+            self._products.pop(id, None)
+
+    def clear(self) -> None:
+        self._products.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._products),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+category_cache = CategoryCache(ttl=settings.cache.CATEGORY_TTL)
+product_cache = ProductCache(max_size=settings.cache.PRODUCT_MAX_SIZE, ttl=settings.cache.PRODUCT_TTL)
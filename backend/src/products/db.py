@@ -3,11 +3,93 @@ import time
 from typing import List
 
 from loguru import logger
-from sqlalchemy import select, update, insert
+from sqlalchemy import select, update, insert, or_, and_, func, text, delete, tuple_, Select, Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.src.db_core.tables import Product, ProductDate, ProductData, ProductQuanity, Category, Business
-from backend.src.products.models import BusinessUploadProductScheme, ProductGetScheme, CategoryModel
+from backend.src.db_core.tables import (Product, ProductDate, ProductData, ProductQuanity,
+                                        Business, SellableProduct)
+from backend.src.products.cache import category_cache, product_cache
+from backend.src.products.models import (BusinessUploadProductScheme, ProductGetScheme,
+                                         CategoryModel, ProductPageScheme, CatalogFilterScheme,
+                                         CatalogPageScheme, CatalogFacetsScheme, FacetCountScheme)
+from backend.src.products.utils import encode_cursor
+
+# Все четыре таблицы товара заполняются одним выражением и одним коммитом
+CREATE_PRODUCT_QUERY = text("""
+    WITH product AS (
+        INSERT INTO products (price, name, category_id, creator_id, is_deleted)
+        VALUES (CAST(:price AS bigint), CAST(:name AS varchar), CAST(:category_id AS smallint),
+                CAST(:creator_id AS bigint), false)
+        RETURNING id
+    ), quanity AS (
+        INSERT INTO product_quanity (product_id, quanity)
+        SELECT id, CAST(:quanity AS bigint) FROM product
+    ), date AS (
+        INSERT INTO product_date (product_id, start_date, end_date)
+        SELECT id, CAST(:start_date AS timestamp), CAST(:end_date AS timestamp) FROM product
+    )
+    INSERT INTO product_data (product_id, description, sex, adult_only)
+    SELECT id, CAST(:description AS varchar), CAST(:sex AS varchar), CAST(:adult_only AS boolean)
+    FROM product
+    RETURNING product_id
+""")
+
+
+def _sellable_products_query() -> Select:
+    # Удалённые, закончившиеся и истёкшие товары отсеивают триггеры sellable_products,
+    # здесь остаётся только проверка end_date между плановыми очистками
+    now = datetime.datetime.fromtimestamp(time.time())
+    return (
+        select(*SellableProduct.__table__.columns)
+        .where(
+            or_(SellableProduct.end_date.is_(None),
+                SellableProduct.end_date > now)))
+
+
+def _catalog_conditions(filters: CatalogFilterScheme) -> list:
+    conditions = []
+    if filters.category_id is not None:
+        conditions.append(SellableProduct.category_id == filters.category_id)
+    if filters.min_price is not None:
+        conditions.append(SellableProduct.price >= filters.min_price)
+    if filters.max_price is not None:
+        conditions.append(SellableProduct.price <= filters.max_price)
+    if filters.sex is not None:
+        conditions.append(SellableProduct.sex == filters.sex)
+    if filters.adult_only is not None:
+        conditions.append(SellableProduct.adult_only.is_(filters.adult_only))
+    return conditions
+
+
+def _to_product_scheme(row: Row) -> ProductGetScheme:
+    end_date = row.end_date.date() if row.end_date else None
+    return ProductGetScheme(
+        product_id=row.product_id,
+        name=row.name,
+        description=row.description,
+        category_id=row.category_id,
+        price=row.price,
+        logo_path=f"https://drive.google.com/file/d/{row.logo_path}/preview" if row.logo_path else None,
+        sex=row.sex,
+        adult_only=row.adult_only,
+        start_date=str(row.start_date.date()),
+        end_date=str(end_date),
+        quanity=row.quanity,
+        creator_id=row.creator_id)
+
+
+def _product_dates(creds: BusinessUploadProductScheme) -> tuple[datetime.datetime, datetime.datetime | None]:
+    start_date_datetime_obj = datetime.datetime.combine(creds.start_date, datetime.time.min,
+                                                        tzinfo=datetime.timezone.utc)
+    start_date_timestamp = round(start_date_datetime_obj.timestamp())
+    start_date_timestamp = datetime.datetime.fromtimestamp(start_date_timestamp, tz=None)
+    if not creds.end_date:
+        return start_date_timestamp, None
+    end_date_datetime_obj = datetime.datetime.combine(creds.end_date, datetime.time.max,
+                                                      tzinfo=datetime.timezone.utc)
+    end_date_timestamp = round(end_date_datetime_obj.timestamp())
+    end_date_timestamp = datetime.datetime.fromtimestamp(end_date_timestamp, tz=None)
+    return start_date_timestamp, end_date_timestamp
 
 
 class BusinessDB:
@@ -19,60 +101,57 @@ class BusinessDB:
             business_id: id,
             session: AsyncSession
     ) -> str:
+        start_date, end_date = _product_dates(creds)
         result = await session.execute(
-            insert(Product)
-            .values(price=creds.price, name=creds.name,
-                    category_id=creds.category_id,
-                    creator_id=business_id,
-                    is_deleted=False)
-            .returning(Product.id))
-        await session.commit()
-
+            CREATE_PRODUCT_QUERY,
+            {'price': creds.price, 'name': creds.name,
+             'category_id': creds.category_id,
+             'creator_id': int(business_id),
+             'quanity': creds.quanity,
+             'start_date': start_date, 'end_date': end_date,
+             'description': creds.description,
+             'sex': creds.sex, 'adult_only': creds.adult_only})
         product_id = result.scalar()
-        registration_data = [
-            ProductQuanity(
-                product_id=product_id,
-                quanity=creds.quanity), ]
-
-        start_date_datetime_obj = datetime.datetime.combine(creds.start_date, datetime.time.min,
-                                                            tzinfo=datetime.timezone.utc)
-        start_date_timestamp = round(start_date_datetime_obj.timestamp())
-        start_date_timestamp = datetime.datetime.fromtimestamp(start_date_timestamp, tz=None)
-        if creds.end_date:
-            end_date_datetime_obj = datetime.datetime.combine(creds.end_date, datetime.time.max,
-                                                              tzinfo=datetime.timezone.utc)
-            end_date_timestamp = round(end_date_datetime_obj.timestamp())
-            end_date_timestamp = datetime.datetime.fromtimestamp(end_date_timestamp, tz=None)
-
-            registration_data.append(
-                ProductDate(
-                    product_id=product_id,
-                    start_date=start_date_timestamp,
-                    end_date=end_date_timestamp)
-            )
-        else:
-            registration_data.append(
-                ProductDate(
-                    product_id=product_id,
-                    start_date=start_date_timestamp))
-
-        registration_data.append(
-            ProductData(
-                product_id=product_id,
-                description=creds.description,
-                sex=creds.sex,
-                adult_only=creds.adult_only)
-        )
-
-        session.add_all(registration_data)
         await session.commit()
+        product_cache.invalidate([product_id])
         return product_id
 
     @staticmethod
     @logger.catch
-    async def get_categories_ids(session: AsyncSession) -> Category:
-        result = await session.execute(select(Category.id).order_by(Category.id))
-        return result.scalars().all()
+    async def import_products(
+            rows: List[BusinessUploadProductScheme],
+            business_id: int,
+            session: AsyncSession
+    ) -> List[int]:
+        result = await session.execute(
+            insert(Product).returning(Product.id, sort_by_parameter_order=True),
+            [{'price': creds.price, 'name': creds.name,
+              'category_id': creds.category_id,
+              'creator_id': business_id,
+              'is_deleted': False} for creds in rows])
+        products_ids = result.scalars().all()
+        dates = [_product_dates(creds) for creds in rows]
+        await session.execute(
+            insert(ProductQuanity),
+            [{'product_id': product_id, 'quanity': creds.quanity}
+             for product_id, creds in zip(products_ids, rows)])
+        await session.execute(
+            insert(ProductDate),
+            [{'product_id': product_id, 'start_date': start_date, 'end_date': end_date}
+             for product_id, (start_date, end_date) in zip(products_ids, dates)])
+        await session.execute(
+            insert(ProductData),
+            [{'product_id': product_id, 'description': creds.description,
+              'sex': creds.sex, 'adult_only': creds.adult_only}
+             for product_id, creds in zip(products_ids, rows)])
+        await session.commit()
+        product_cache.invalidate(products_ids)
+        return products_ids
+
+    @staticmethod
+    @logger.catch
+    async def category_exists(session: AsyncSession, id: int) -> bool:
+        return await category_cache.contains(session=session, id=id)
 
     @staticmethod
     @logger.catch
@@ -81,29 +160,8 @@ class BusinessDB:
             id: int | None = None,
     ) -> CategoryModel | List[CategoryModel]:
         if id:
-            result = await session.execute(select(Category).where(Category.id == id))
-            category = result.scalar()
-            if not category:
-                return None
-            if category.is_deleted is True:
-                return None
-            return CategoryModel(
-                category_id=category.id,
-                name=category.name,
-                description=category.description)
-        else:
-            result = await session.execute(select(Category).order_by(Category.id))
-            categories = result.scalars().all()
-            categories_list = []
-            for category in categories:
-                if category.is_deleted is True:
-                    continue
-                categories_list.append(
-                    CategoryModel(
-                        category_id=category.id,
-                        name=category.name,
-                        description=category.description))
-            return categories_list
+            return await category_cache.get(session=session, id=id)
+        return await category_cache.get_all(session=session)
 
     @staticmethod
     @logger.catch
@@ -111,106 +169,148 @@ class BusinessDB:
             id: int,
             session: AsyncSession
     ) -> ProductGetScheme:
-        product_result = await session.execute(select(Product).where(Product.id == id))
-        product_data_result = await session.execute(select(ProductData).where(ProductData.product_id == id))
-        product_date_result = await session.execute(select(ProductDate).where(ProductDate.product_id == id))
-        product_quanity = await session.execute(select(ProductQuanity).where(ProductQuanity.product_id == id))
-
-        product = product_result.scalar()
-        product_data = product_data_result.scalar()
-        product_quanity = product_quanity.scalar()
-        if product_quanity:
-            if product_quanity == 0:
-                return None
-        product_date = product_date_result.scalar()
-        if not product:
-            return None
-        if product.is_deleted is True:
+        product = product_cache.get(id)
+        if product:
+            return product
+        result = await session.execute(
+            _sellable_products_query()
+            .where(SellableProduct.product_id == id))
+        row = result.first()
+        if not row:
             return None
-        start_date = product_date.start_date.date()
-
-        if product_date.end_date:
-            if datetime.datetime.fromtimestamp(time.time()) >= product_date.end_date:
-                return None
-            if product_date.start_date > product_date.end_date:
-                return None
-            end_date = product_date.end_date.date()
-        else:
-            end_date = None
-
-        if product_data.logo_path:
-            return ProductGetScheme(
-                product_id=product.id,
-                name=product.name,
-                description=product_data.description,
-                category_id=product.category_id,
-                price=product.price,
-                logo_path=f"https://drive.google.com/file/d/{product_data.logo_path}/preview",
-                sex=product_data.sex,
-                adult_only=product_data.adult_only,
-                start_date=str(start_date),
-                end_date=str(end_date),
-                quanity=product_quanity.quanity,
-                creator_id=product.creator_id)
-        return ProductGetScheme(
-            product_id=product.id,
-            name=product.name,
-            description=product_data.description,
-            category_id=product.category_id,
-            price=product.price,
-            sex=product_data.sex,
-            adult_only=product_data.adult_only,
-            start_date=str(start_date),
-            end_date=str(end_date),
-            quanity=product_quanity.quanity,
-            creator_id=product.creator_id)
+        product = _to_product_scheme(row)
+        product_cache.put(product)
+        return product
+
+    @staticmethod
+    @logger.catch
+    async def get_products(
+            ids: List[int],
+            session: AsyncSession
+    ) -> List[ProductGetScheme]:
+        ids = list(dict.fromkeys(ids))
+        products = {}
+        for id in ids:
+            product = product_cache.get(id)
+            if product:
+                products[id] = product
+        missing_ids = [id for id in ids if id not in products]
+        if missing_ids:
+            result = await session.execute(
+                _sellable_products_query()
+                .where(SellableProduct.product_id.in_(missing_ids)))
+            for row in result.all():
+                product = _to_product_scheme(row)
+                product_cache.put(product)
+                products[row.product_id] = product
+        return [products[id] for id in ids if id in products]
 
     @staticmethod
     @logger.catch
     async def search_product(
             session: AsyncSession,
             name: str,
-            start_id: int
-    ) -> ProductGetScheme | List[ProductGetScheme]:
-        name = name.lstrip().rstrip()
-        limit = 30
-        semi_product_data = None
+            limit: int,
+            after: dict | None = None,
+    ) -> ProductPageScheme:
+        # Оба условия обслуживаются GIN-индексом sellable_products_name_trgm_idx,
+        # `%>` (word_similarity) даёт устойчивость к опечаткам
+        rank = func.word_similarity(name, SellableProduct.name)
+        query = (
+            _sellable_products_query()
+            .add_columns(rank.label('rank'))
+            .where(
+                or_(SellableProduct.name.icontains(name, autoescape=True),
+                    SellableProduct.name.op('%>')(name)))
+            .order_by(rank.desc(), SellableProduct.product_id.asc())
+            .limit(limit + 1))
+        if after:
+            query = query.where(
+                or_(rank < after['rank'],
+                    and_(rank == after['rank'], SellableProduct.product_id > after['id'])))
+        result = await session.execute(query)
+        products = result.all()
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = encode_cursor(
+                {'q': name, 'rank': products[-1].rank, 'id': products[-1].product_id})
+        return ProductPageScheme(
+            products=[_to_product_scheme(product) for product in products],
+            next_cursor=next_cursor)
+
+    @staticmethod
+    @logger.catch
+    async def browse_catalog(
+            session: AsyncSession,
+            filters: CatalogFilterScheme,
+            limit: int,
+            after: dict | None = None,
+    ) -> CatalogPageScheme:
+        query = (
+            _sellable_products_query()
+            .where(*_catalog_conditions(filters))
+            .limit(limit + 1))
+        position = tuple_(SellableProduct.price, SellableProduct.product_id)
+        if filters.sort == 'price_asc':
+            query = query.order_by(SellableProduct.price.asc(), SellableProduct.product_id.asc())
+            if after:
+                query = query.where(position > tuple_(after['price'], after['id']))
+        elif filters.sort == 'price_desc':
+            query = query.order_by(SellableProduct.price.desc(), SellableProduct.product_id.desc())
+            if after:
+                query = query.where(position < tuple_(after['price'], after['id']))
+        else:
+            query = query.order_by(SellableProduct.product_id.desc())
+            if after:
+                query = query.where(SellableProduct.product_id < after['id'])
+        result = await session.execute(query)
+        products = result.all()
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = encode_cursor({
+                'filters': filters.model_dump(mode='json'),
+                'price': products[-1].price,
+                'id': products[-1].product_id})
+        return CatalogPageScheme(
+            products=[_to_product_scheme(product) for product in products],
+            next_cursor=next_cursor)
+
+    @staticmethod
+    @logger.catch
+    async def get_catalog_facets(
+            session: AsyncSession,
+            filters: CatalogFilterScheme,
+    ) -> CatalogFacetsScheme:
+        # Один проход GROUPING SETS вместо трёх GROUP BY;
+        # в каждой строке заполнен только столбец своего набора
         result = await session.execute(
-            select(Product)
-            .order_by(Product.id.asc())
-            .limit(limit)
-            .where(Product.name.ilike(f"%{name}%"), Product.id >= start_id))
-        product_data = result.scalars().all()
-        if not product_data:
-            result = await session.execute(
-                select(Product)
-                .order_by(Product.id.asc())
-                .limit(limit)
-                .where(Product.name.ilike(f"%{name.replace(' ', '%')}%"), Product.id >= start_id))
-            product_data = result.scalars().all()
-
-        elif len(product_data) < limit:
-            limit = limit - len(product_data)
-            result = await session.execute(
-                select(Product)
-                .order_by(Product.id.asc())
-                .limit(limit)
-                .where(Product.name.ilike(f"%{name.replace(' ', '%')}%"), Product.id > product_data[-1].id))
-            semi_product_data = result.scalars().all()
-        if not product_data and not semi_product_data:
-            return None
-        product_get_list = []
-        if product_data:
-            for product in product_data:
-                cur_product_data = await BusinessDB.get_product(id=product.id, session=session)
-                if cur_product_data:
-                    product_get_list.append(cur_product_data)
-        if semi_product_data:
-            for product in semi_product_data:
-                cur_product_data = await BusinessDB.get_product(id=product.id, session=session)
-                if cur_product_data:
-                    product_get_list.append(cur_product_data)
-        return product_get_list
+            _sellable_products_query()
+            .with_only_columns(
+                SellableProduct.category_id, SellableProduct.sex,
+                SellableProduct.adult_only, func.count().label('count'))
+            .where(*_catalog_conditions(filters))
+            .group_by(func.grouping_sets(
+                SellableProduct.category_id, SellableProduct.sex, SellableProduct.adult_only)))
+        facets = {'category_id': [], 'sex': [], 'adult_only': []}
+        for row in result.all():
+            for facet in facets:
+                value = getattr(row, facet)
+                if value is not None:
+                    facets[facet].append(FacetCountScheme(value=value, count=row.count))
+        for counts in facets.values():
+            counts.sort(key=lambda facet_count: facet_count.count, reverse=True)
+        return CatalogFacetsScheme(**facets)
+
+    @staticmethod
+    @logger.catch
+    async def expire_sellable_products(session: AsyncSession) -> int:
+        result = await session.execute(
+            delete(SellableProduct)
+            .where(SellableProduct.end_date <= datetime.datetime.fromtimestamp(time.time())))
+        await session.commit()
+        return result.rowcount
 
     @staticmethod
     @logger.catch
@@ -224,32 +324,36 @@ class BusinessDB:
             .where(ProductData.product_id == product_id)
             .values(logo_path=file_id))
         await session.commit()
+        product_cache.invalidate([product_id])
 
     @staticmethod
     @logger.catch
     async def get_business_products(
             id: int,
-            session: AsyncSession
-    ) -> List[ProductGetScheme]:
+            session: AsyncSession,
+            limit: int,
+            after: dict | None = None,
+    ) -> ProductPageScheme:
         business_result = await session.execute(
-            select(Business)
+            select(Business.id)
             .where(Business.id == id)
         )
         if not business_result.scalar():
             return None
 
-        products_result = await session.execute(
-            select(Product.id)
-            .where(Product.creator_id == id))
-        products_ids = products_result.scalars().all()
-
-        if not products_ids:
-            return None
-
-        products = []
-        for id in products_ids:
-            product = await BusinessDB.get_product(id=id, session=session)
-            if not product:
-                continue
-            products.append(product)
-        return products
+        query = (
+            _sellable_products_query()
+            .where(SellableProduct.creator_id == id)
+            .order_by(SellableProduct.product_id.asc())
+            .limit(limit + 1))
+        if after:
+            query = query.where(SellableProduct.product_id > after['id'])
+        result = await session.execute(query)
+        products = result.all()
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = encode_cursor({'business_id': id, 'id': products[-1].product_id})
+        return ProductPageScheme(
+            products=[_to_product_scheme(product) for product in products],
+            next_cursor=next_cursor)
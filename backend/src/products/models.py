@@ -1,4 +1,5 @@
 import datetime
+from typing import List, Literal
 
 from fastapi import HTTPException, status
 from pydantic import BaseModel, field_validator, Field
@@ -39,6 +40,35 @@ class ProductGetScheme(BaseModel):
     creator_id: int
 
 
+class ProductPageScheme(BaseModel):
+    products: List[ProductGetScheme]
+    next_cursor: str | None = None
+
+
+class CatalogFilterScheme(BaseModel):
+    category_id: int | None = None
+    min_price: int | None = Field(None, ge=0)
+    max_price: int | None = Field(None, ge=0)
+    sex: Literal['m', 'f', 'u'] | None = None
+    adult_only: bool | None = None
+    sort: Literal['newest', 'price_asc', 'price_desc'] = 'newest'
+
+
+class FacetCountScheme(BaseModel):
+    value: int | str | bool
+    count: int
+
+
+class CatalogFacetsScheme(BaseModel):
+    category_id: List[FacetCountScheme]
+    sex: List[FacetCountScheme]
+    adult_only: List[FacetCountScheme]
+
+
+class CatalogPageScheme(ProductPageScheme):
+    facets: CatalogFacetsScheme | None = None
+
+
 class CategoryModel(BaseModel):
     category_id: int
     name: str
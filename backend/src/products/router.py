@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, UploadFile
 from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing_extensions import List
 
@@ -8,13 +9,37 @@ from backend.src.db_core.helper import db_helper
 from backend.src.global_config import settings
 from backend.src.global_dependencies import get_payload_by_access_token, TokenPayloadModel, check_uploaded_file
 from backend.src.products.db import BusinessDB
-from backend.src.products.models import BusinessUploadProductScheme, ProductGetScheme, CategoryModel
+from backend.src.products.models import (BusinessUploadProductScheme, ProductGetScheme,
+                                         CategoryModel, ProductPageScheme, CatalogFilterScheme,
+                                         CatalogPageScheme)
+from backend.src.products.utils import decode_cursor, iter_import_rows
 
 router = APIRouter(
     tags=["products"],
     prefix=settings.prefix.PRODUCTS
 )
 
+IMPORT_CONTENT_TYPES = {'text/csv', 'application/x-ndjson', 'application/jsonl'}
+
+
+async def import_batch(
+        batch: list[tuple[int, BusinessUploadProductScheme]],
+        business_id: int,
+        session: AsyncSession,
+        report: dict
+) -> None:
+    products_ids = await BusinessDB.import_products(
+        rows=[creds for _, creds in batch],
+        business_id=business_id,
+        session=session)
+    if not products_ids:
+        await session.rollback()
+        report['errors'].extend(
+            {'row': row_number, 'detail': 'Batch insert failed'} for row_number, _ in batch)
+        return
+    report['imported'] += len(products_ids)
+    report['product_ids'].extend(products_ids)
+
 
 @router.post('/')
 async def create_new_product(
@@ -26,7 +51,7 @@ async def create_new_product(
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='Only for Business')
-    if creds.category_id not in await BusinessDB.get_categories_ids(session=session):
+    if not await BusinessDB.category_exists(session=session, id=creds.category_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Category not found')
@@ -39,6 +64,52 @@ async def create_new_product(
         content={"product_id": product_id})
 
 
+@router.post('/import')
+async def import_business_products(
+        request: Request,
+        token_payload: TokenPayloadModel = Depends(get_payload_by_access_token),
+        session: AsyncSession = Depends(db_helper.get_async_session)
+) -> JSONResponse:
+    if token_payload.role != 'business':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='Only for Business')
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if content_type not in IMPORT_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f'Supported content types are {IMPORT_CONTENT_TYPES}')
+    business_id = int(token_payload.uid)
+    report = {'imported': 0, 'product_ids': [], 'errors': []}
+    batch = []
+    async for row_number, row, error in iter_import_rows(request.stream(), csv_format=content_type == 'text/csv'):
+        if error:
+            report['errors'].append({'row': row_number, 'detail': error})
+            continue
+        try:
+            creds = BusinessUploadProductScheme.model_validate(row)
+        except ValidationError as e:
+            report['errors'].append({
+                'row': row_number,
+                'detail': e.errors(include_url=False, include_context=False, include_input=False)})
+            continue
+        except HTTPException as e:
+            report['errors'].append({'row': row_number, 'detail': e.detail})
+            continue
+        if not await BusinessDB.category_exists(session=session, id=creds.category_id):
+            report['errors'].append({'row': row_number, 'detail': 'Category not found'})
+            continue
+        batch.append((row_number, creds))
+        if len(batch) >= settings.imports.BATCH_SIZE:
+            await import_batch(batch=batch, business_id=business_id, session=session, report=report)
+            batch = []
+    if batch:
+        await import_batch(batch=batch, business_id=business_id, session=session, report=report)
+    return JSONResponse(
+        status_code=status.HTTP_201_CREATED if report['imported'] else status.HTTP_400_BAD_REQUEST,
+        content=report)
+
+
 @router.get('/',
             response_model=ProductGetScheme,
             response_model_exclude_none=True)
@@ -65,26 +136,56 @@ async def get_all_categories(
     return category
 
 
-@router.get('/search', response_model=List[ProductGetScheme])
+@router.get('/search', response_model=ProductPageScheme)
 async def search_business_product(
         name: str,
-        start_id: int | None = None,
+        cursor: str | None = None,
+        limit: int = Query(settings.pagination.DEFAULT_PAGE_SIZE, ge=1, le=settings.pagination.MAX_PAGE_SIZE),
         session: AsyncSession = Depends(db_helper.get_async_session)
 ) -> JSONResponse:
-    if start_id:
-        products = await BusinessDB.search_product(name=name,
-                                                   start_id=start_id,
-                                                   session=session)
-    else:
-        products = await BusinessDB.search_product(name=name,
-                                                   start_id=1,
-                                                   session=session)
-    if not products:
+    name = name.lstrip().rstrip()
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after or after.get('q') != name:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail='Invalid cursor')
+    products = await BusinessDB.search_product(name=name,
+                                               limit=limit,
+                                               after=after,
+                                               session=session)
+    if not products or not products.products:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail='Product not found')
     return products
 
 
+@router.get('/catalog', response_model=CatalogPageScheme, response_model_exclude_none=True)
+async def browse_catalog(
+        filters: CatalogFilterScheme = Depends(),
+        cursor: str | None = None,
+        facets: bool = True,
+        limit: int = Query(settings.pagination.DEFAULT_PAGE_SIZE, ge=1, le=settings.pagination.MAX_PAGE_SIZE),
+        session: AsyncSession = Depends(db_helper.get_async_session)
+) -> JSONResponse:
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after or after.get('filters') != filters.model_dump(mode='json'):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail='Invalid cursor')
+    page = await BusinessDB.browse_catalog(session=session,
+                                           filters=filters,
+                                           limit=limit,
+                                           after=after)
+    if not page:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Фасеты считаются только для первой страницы
+    if facets and not cursor:
+        page.facets = await BusinessDB.get_catalog_facets(session=session, filters=filters)
+    return page
+
+
 @router.get('/image')
 async def get_product_image(
         product_id: int,
@@ -142,15 +243,25 @@ async def upload_business_product_image(
     )
 
 
-@router.get('/products/profile')
+@router.get('/products/profile', response_model=ProductPageScheme)
 async def get_all_business_products(
         id: int,
+        cursor: str | None = None,
+        limit: int = Query(settings.pagination.DEFAULT_PAGE_SIZE, ge=1, le=settings.pagination.MAX_PAGE_SIZE),
         session: AsyncSession = Depends(db_helper.get_async_session)
 ) -> JSONResponse:
-    products = await BusinessDB.get_business_products(id=id, session=session)
-    if not products:
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after or after.get('business_id') != id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail='Invalid cursor')
+    products = await BusinessDB.get_business_products(id=id,
+                                                      limit=limit,
+                                                      after=after,
+                                                      session=session)
+    if not products or not products.products:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='This Business haven\'t any products or not exist\'s')
     return products
-    
\ No newline at end of file
@@ -0,0 +1,15 @@
+import asyncio
+
+from loguru import logger
+
+from backend.src.db_core.helper import db_helper
+from backend.src.products.db import BusinessDB
+
+
+async def expire_sellable_products(interval: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        async with db_helper.session_factory() as session:
+            expired = await BusinessDB.expire_sellable_products(session=session)
+        if expired:
+            logger.info(f'Expired sellable products removed: {expired}')
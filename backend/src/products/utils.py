@@ -0,0 +1,152 @@
+import base64
+import binascii
+import codecs
+import csv
+import hashlib
+import hmac
+import json
+from collections import deque
+from typing import AsyncIterator
+
+from backend.src.global_config import settings
+
+
+def _sign(body: bytes) -> str:
+    signature = hmac.new(settings.pagination.CURSOR_SECRET_KEY.encode(), body, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(signature[:16]).rstrip(b'=').decode()
+
+
+def encode_cursor(payload: dict) -> str:
+    body = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).rstrip(b'=')
+    return f'{body.decode()}.{_sign(body)}'
+
+
+def decode_cursor(cursor: str) -> dict | None:
+    try:
+        body, signature = cursor.encode().split(b'.')
+        if not hmac.compare_digest(signature, _sign(body).encode()):
+            return None
+        payload = json.loads(base64.urlsafe_b64decode(body + b'=' * (-len(body) % 4)))
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+    if not isinstance(payload, dict):
+        return None
+    return payload
+
+
+def _ends_quoted(line: bytes, quoted: bool) -> bool:
+    # Повторяет разбор csv (диалект excel): кавычка открывает значение только в его начале,
+    # внутри значения в кавычках "" - экранированная кавычка, одиночная закрывает значение.
+    # Кавычка в середине значения без кавычек - обычный символ и запись не продлевает
+    if b'"' not in line:
+        return quoted
+    at_start = not quoted
+    i = 0
+    while i < len(line):
+        char = line[i:i + 1]
+        if quoted:
+            if char == b'"':
+                if line[i + 1:i + 2] == b'"':
+                    i += 2
+                    continue
+                quoted = False
+        elif char == b'"' and at_start:
+            quoted = True
+        at_start = not quoted and char == b','
+        i += 1
+    return quoted
+
+
+async def _iter_records(stream: AsyncIterator[bytes], csv_format: bool) -> AsyncIterator[bytes]:
+    # Записи выделяются по байтам до декодирования: в UTF-8 байты '\n', ',' и '"' не встречаются
+    # внутри многобайтовых символов. В CSV перевод строки внутри значения в кавычках не завершает запись
+    buffer = b''
+    record = b''
+    quoted = False
+    first = True
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            record += line + b'\n'
+            if csv_format:
+                quoted = _ends_quoted(line, quoted)
+                if quoted:
+                    continue
+            yield record.removeprefix(codecs.BOM_UTF8) if first else record
+            record, first = b'', False
+    record += buffer
+    if record:
+        yield record.removeprefix(codecs.BOM_UTF8) if first else record
+
+
+class _LineFeed:
+    # Источник строк для одного csv.reader на весь поток: строки записи подкладываются
+    # перед каждым next(reader), и запись с переводами строк в кавычках читается целиком
+
+    def __init__(self) -> None:
+        self.lines = deque()
+
+    def __iter__(self) -> '_LineFeed':
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+    def push(self, text: str) -> None:
+        # str.splitlines делит и по \x0b, \u2028 и т.п., а они допустимы внутри значения
+        self.lines.extend(line + '\n' for line in text.removesuffix('\n').split('\n'))
+
+
+async def iter_import_rows(
+        stream: AsyncIterator[bytes],
+        csv_format: bool
+) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    # Возвращает (номер строки, данные строки, ошибка разбора)
+    header = None
+    row_number = 0
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    async for record in _iter_records(stream, csv_format):
+        try:
+            text = record.decode('utf-8')
+        except UnicodeDecodeError:
+            text = None
+        if text is not None and not text.strip():
+            continue
+        if csv_format and header is None:
+            if text is None:
+                yield row_number, None, 'Header is not valid UTF-8'
+                return
+            feed.push(text)
+            header = next(reader)
+            continue
+        row_number += 1
+        if text is None:
+            yield row_number, None, 'Row is not valid UTF-8'
+            continue
+        try:
+            if csv_format:
+                feed.push(text)
+                values = next(reader)
+                if feed.lines:
+                    # Границы записи разошлись с csv.reader: запись отклоняется целиком,
+                    # а не теряется молча
+                    feed.lines.clear()
+                    yield row_number, None, 'Malformed quoted value'
+                    continue
+                if len(values) != len(header):
+                    yield row_number, None, f'Expected {len(header)} columns, got {len(values)}'
+                    continue
+                yield row_number, {key: value or None for key, value in zip(header, values)}, None
+            else:
+                row = json.loads(text)
+                if not isinstance(row, dict):
+                    yield row_number, None, 'Row must be a JSON object'
+                    continue
+                yield row_number, row, None
+        except (ValueError, csv.Error) as e:
+            feed.lines.clear()
+            yield row_number, None, str(e)
@@ -1,12 +1,49 @@
 from typing import List
 
 from loguru import logger
-from sqlalchemy import update, select
+from sqlalchemy import update, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.src.db_core.tables import BusinessProfile, BusinessFinance, UsersBalance
+from backend.src.db_core.tables import BusinessProfile, UsersBalance
 from backend.src.profile.models import BusinessProfileScheme
 
+# Баланс продавца: свёрнутый итог плюс ещё не свёрнутые записи журнала
+BUSINESS_BALANCE_QUERY = text("""
+    SELECT coalesce((SELECT balance_cents
+                     FROM business_finance_rollups
+                     WHERE business_id = CAST(:business_id AS bigint)), 0)
+               + coalesce((SELECT sum(balance_cents)
+                           FROM business_ledger
+                           WHERE business_id = CAST(:business_id AS bigint)
+                             AND NOT rolled_up), 0) AS balance_cents
+""")
+
+# Свёртка очередной пачки журнала: записи помечаются rolled_up и в той же
+# транзакции прибавляются к итогам, поэтому чтение баланса не видит их дважды
+ROLLUP_LEDGER_QUERY = text("""
+    WITH batch AS (
+        UPDATE business_ledger
+        SET rolled_up = true
+        WHERE id IN (SELECT id
+                     FROM business_ledger
+                     WHERE NOT rolled_up
+                     ORDER BY id
+                     LIMIT CAST(:batch_size AS integer)
+                     FOR UPDATE SKIP LOCKED)
+        RETURNING business_id, revenue_cents, balance_cents, earnings_cents
+    ), totals AS (
+        INSERT INTO business_finance_rollups (business_id, revenue_cents, balance_cents, earnings_cents)
+        SELECT business_id, sum(revenue_cents), sum(balance_cents), sum(earnings_cents)
+        FROM batch
+        GROUP BY business_id
+        ON CONFLICT (business_id) DO UPDATE
+            SET revenue_cents  = business_finance_rollups.revenue_cents + excluded.revenue_cents,
+                balance_cents  = business_finance_rollups.balance_cents + excluded.balance_cents,
+                earnings_cents = business_finance_rollups.earnings_cents + excluded.earnings_cents
+    )
+    SELECT count(*) FROM batch
+""")
+
 
 class BusinessDB:
     @staticmethod
@@ -62,9 +99,22 @@ class BusinessDB:
             session: AsyncSession
     ) -> int:
         result = await session.execute(
-            select(BusinessFinance.balance)
-            .where(BusinessFinance.business_id == int(business_id)))
-        return int(result.scalar())
+            BUSINESS_BALANCE_QUERY,
+            {'business_id': int(business_id)})
+        return int(result.scalar()) // 100
+
+    @staticmethod
+    @logger.catch
+    async def rollup_ledger(
+            session: AsyncSession,
+            batch_size: int,
+    ) -> int:
+        result = await session.execute(
+            ROLLUP_LEDGER_QUERY,
+            {'batch_size': batch_size})
+        rolled_up = result.scalar()
+        await session.commit()
+        return rolled_up
 
 
 class UsersDB:
@@ -0,0 +1,18 @@
+import asyncio
+
+from loguru import logger
+
+from backend.src.db_core.helper import db_helper
+from backend.src.profile.db import BusinessDB
+
+
+async def rollup_business_ledger(interval: int, batch_size: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        # Пачки сворачиваются подряд, пока журнал не опустеет
+        while True:
+            async with db_helper.session_factory() as session:
+                rolled_up = await BusinessDB.rollup_ledger(session=session, batch_size=batch_size)
+            if not rolled_up:
+                break
+            logger.info(f'Business ledger entries rolled up: {rolled_up}')
@@ -0,0 +1,16 @@
+import time
+
+from backend.src.auth.limiter import TokenBucketLimiter
+
+
+def test_token_bucket_limits_burst_and_refills():
+    limiter = TokenBucketLimiter(rate=10, burst=3, max_keys=2)
+    assert [limiter.acquire('1.1.1.1') for _ in range(3)] == [0, 0, 0]
+    retry_after = limiter.acquire('1.1.1.1')
+    assert 0 < retry_after <= 0.1
+    # Другой ключ не зависит от исчерпанного ведра
+    assert limiter.acquire('2.2.2.2') == 0
+    time.sleep(0.15)
+    assert limiter.acquire('1.1.1.1') == 0
+    limiter.acquire('3.3.3.3')
+    assert len(limiter._buckets) == 2
@@ -0,0 +1,56 @@
+import pytest
+
+from backend.src.orders.cart_buffer import CartBuffer, CartFlushError, JournalCartStore, JournalInUse
+
+
+@pytest.mark.asyncio
+async def test_cart_buffer_merges_and_replays(tmp_path):
+    journal = str(tmp_path / 'cart.journal')
+    buffer = CartBuffer(store=JournalCartStore(journal), node_id='test')
+    await buffer.add(1, 10, 2)
+    await buffer.add(1, 10, 3)
+    await buffer.remove(1, 20, 1)
+    assert buffer.merge(1, {20: 1, 30: 4}) == {10: 5, 30: 4}
+
+    flushed = []
+
+    async def apply(cleared_user_ids, rows, seq):
+        flushed.append((cleared_user_ids, rows, seq))
+        return True
+
+    async def fail(cleared_user_ids, rows, seq):
+        return False
+
+    # Неудачная запись не теряет изменения и не выдаётся за успешную
+    with pytest.raises(CartFlushError):
+        await buffer.flush(fail)
+    assert buffer.stats()['pending_rows'] == 2
+
+    # Журнал занят живым процессом
+    with pytest.raises(JournalInUse):
+        await CartBuffer(store=JournalCartStore(journal), node_id='test').recover(checkpoint=0)
+
+    # Падение до записи в базу: журнал переигрывается целиком
+    buffer.store.close()
+    restored = CartBuffer(store=JournalCartStore(journal), node_id='test')
+    assert await restored.recover(checkpoint=0) == 3
+    assert await restored.flush(apply) == 2
+    assert flushed == [([], [(1, 10, 5), (1, 20, -1)], 3)]
+
+    # Пачка записана, но журнал не успел очиститься: seq из базы отсекает повтор
+    await restored.clear(1)
+    restored.store.close()
+    restored = CartBuffer(store=JournalCartStore(journal), node_id='test')
+    assert await restored.recover(checkpoint=4) == 0
+    assert restored.merge(1, {10: 5}) == {10: 5}
+    assert restored.stats()['pending_users'] == 0
+
+
+@pytest.mark.asyncio
+async def test_cart_buffer_add_respects_limit(tmp_path):
+    buffer = CartBuffer(store=JournalCartStore(str(tmp_path / 'cart.journal')), node_id='test')
+    assert await buffer.add(1, 10, 6, stored=3, limit=10)
+    # В базе 3, в буфере +6: ещё 2 превысили бы предел и в буфер не попадают
+    assert not await buffer.add(1, 10, 2, stored=3, limit=10)
+    assert await buffer.add(1, 10, 1, stored=3, limit=10)
+    assert buffer.merge(1, {10: 3}) == {10: 10}
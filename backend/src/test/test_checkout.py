@@ -0,0 +1,222 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import event, select, insert, update
+
+from backend.src.db_core.helper import db_helper
+from backend.src.db_core.tables import (Business, BusinessFinance, User, UsersBalance,
+                                        UsersCart, CartItem, Product, ProductQuanity)
+from backend.src.global_config import settings
+from backend.src.orders.checkout_queue import CheckoutQueue
+from backend.src.orders.db import UsersDB, BusinessDB as OrderBusinessDB
+from backend.src.orders.idempotency import run_idempotent
+from backend.src.products.db import BusinessDB as ProductBusinessDB
+from backend.src.profile.db import BusinessDB as ProfileBusinessDB
+from backend.src.products.models import BusinessUploadProductScheme
+
+STOCK = 10
+BUYERS = 40
+
+
+async def create_business(session) -> int:
+    result = await session.execute(
+        insert(Business)
+        .values(email=f'{uuid.uuid4().hex[:20]}@stress.com', hashed_password='-', is_deleted=False)
+        .returning(Business.id))
+    business_id = result.scalar()
+    session.add(BusinessFinance(business_id=business_id, balance=0, revenue=0, earnings=0))
+    await session.commit()
+    return business_id
+
+
+async def create_buyer(session, product_id: int, quantity: int) -> int:
+    result = await session.execute(
+        insert(User)
+        .values(email=f'{uuid.uuid4().hex[:20]}@stress.com', hashed_password='-',
+                role='user', is_deleted=False)
+        .returning(User.id))
+    user_id = result.scalar()
+    # В моделях нет ForeignKey, порядок вставки задаётся вручную: корзина раньше позиций
+    session.add_all([
+        UsersBalance(user_id=user_id, balance=10 ** 6),
+        UsersCart(user_id=user_id)])
+    await session.flush()
+    session.add(CartItem(user_id=user_id, product_id=product_id, quantity=quantity))
+    await session.commit()
+    return user_id
+
+
+async def checkout(user_id: int):
+    async with db_helper.session_factory() as session:
+        return await UsersDB.checkout(session=session, user_id=user_id)
+
+
+async def create_product(session, business_id: int) -> int:
+    return await ProductBusinessDB.create_product(
+        creds=BusinessUploadProductScheme(
+            name='Stress product',
+            description='Concurrent checkout stress test',
+            category_id=1,
+            price=10,
+            sex='u',
+            adult_only=False,
+            start_date=datetime.date.today(),
+            quanity=STOCK),
+        business_id=business_id,
+        session=session)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_checkout_never_oversells():
+    async with db_helper.session_factory() as session:
+        business_id = await create_business(session)
+        product_id = await create_product(session, business_id)
+        buyers = [await create_buyer(session, product_id, quantity=1 + i % 2) for i in range(BUYERS)]
+
+    results = await asyncio.gather(*(checkout(user_id) for user_id in buyers))
+
+    async with db_helper.session_factory() as session:
+        result = await session.execute(
+            select(ProductQuanity.quanity)
+            .where(ProductQuanity.product_id == product_id))
+        quanity = result.scalar()
+    sold = sum(1 + i % 2 for i, result in enumerate(results) if result.status == 'created')
+    assert quanity >= 0
+    assert sold == STOCK - quanity
+    assert all(result.status in ('created', 'insufficient_stock') for result in results)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_idempotency_key_runs_handler_once():
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(0.5)
+        return {'order_id': len(calls)}
+
+    key = uuid.uuid4().hex
+    responses = await asyncio.gather(*(
+        run_idempotent(key=key, user_id=0, scope='test', handler=handler) for _ in range(5)))
+    assert len(calls) == 1
+    assert {response.body for response in responses} == {b'{"order_id":1}'}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_idempotency_lease_outlives_slow_handler(monkeypatch):
+    # Обработчик дольше аренды: продление не даёт повтору перехватить ключ
+    monkeypatch.setattr(settings.idempotency, 'LEASE', 1)
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(2.5)
+        return {'order_id': len(calls)}
+
+    key = uuid.uuid4().hex
+    first = asyncio.create_task(run_idempotent(key=key, user_id=0, scope='test', handler=handler))
+    await asyncio.sleep(1.5)
+    retry = await run_idempotent(key=key, user_id=0, scope='test', handler=handler)
+    assert len(calls) == 1
+    assert retry.body == (await first).body
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_queued_checkout_bounds_workers():
+    async with db_helper.session_factory() as session:
+        business_id = await create_business(session)
+        product_id = await create_product(session, business_id)
+        buyers = [await create_buyer(session, product_id, quantity=1) for _ in range(STOCK + 2)]
+        orders = [await UsersDB.create_pending_order(session=session, user_id=user_id) for user_id in buyers]
+
+    queue = CheckoutQueue(max_size=len(orders))
+    assert all(queue.submit(order_id, user_id) for order_id, user_id in zip(orders, buyers))
+    assert not queue.submit(0, 0)
+    workers = queue.start(2)
+    try:
+        await asyncio.wait_for(queue.queue.join(), timeout=30)
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+    async with db_helper.session_factory() as session:
+        statuses = [
+            (await UsersDB.get_order_status(session=session, user_id=user_id, order_id=order_id)).status
+            for order_id, user_id in zip(orders, buyers)]
+    assert statuses.count('created') == STOCK
+    assert statuses.count('insufficient_stock') == 2
+    assert queue.stats()['rejected'] == 1
+
+
+def test_checkout_queue_waiters_share_event():
+    queue = CheckoutQueue(max_size=1)
+    with queue.watch(1) as first:
+        with queue.watch(1) as second:
+            assert first is second
+        # Ушёл один из ждущих - событие остаётся для второго
+        assert queue._waiters[1] is first
+    assert 1 not in queue._waiters
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_order_history_single_query():
+    async with db_helper.session_factory() as session:
+        business_id = await create_business(session)
+        product_id = await create_product(session, business_id)
+        user_id = await create_buyer(session, product_id, quantity=1)
+    await checkout(user_id)
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db_helper.engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        async with db_helper.session_factory() as session:
+            history = await UsersDB.get_order_history(session=session, user_id=user_id, limit=10)
+    finally:
+        event.remove(db_helper.engine.sync_engine, "before_cursor_execute", count_statement)
+    assert len(statements) == 1
+    assert len(history.orders) == 1
+    assert history.orders[0].price == 10
+    assert [item.product_id for item in history.orders[0].items] == [product_id]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_ledger_balance_survives_rollup():
+    async with db_helper.session_factory() as session:
+        business_id = await create_business(session)
+        product_id = await create_product(session, business_id)
+        buyers = [await create_buyer(session, product_id, quantity=2) for _ in range(3)]
+    for user_id in buyers:
+        assert (await checkout(user_id)).status == 'created'
+
+    # 3 заказа по 2 шт. по 10 - 2% комиссии
+    async with db_helper.session_factory() as session:
+        assert await ProfileBusinessDB.get_balance(business_id=business_id, session=session) == 58
+        while await ProfileBusinessDB.rollup_ledger(session=session, batch_size=2):
+            pass
+        assert await ProfileBusinessDB.get_balance(business_id=business_id, session=session) == 58
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_business_active_orders_keep_shopping_cart():
+    async with db_helper.session_factory() as session:
+        business_id = await create_business(session)
+        product_id = await create_product(session, business_id)
+        user_id = await create_buyer(session, product_id, quantity=2)
+    order_id = (await checkout(user_id)).order_id
+
+    async with db_helper.session_factory() as session:
+        orders = await OrderBusinessDB.get_active_orders(session=session, business_id=business_id)
+        assert [(order['order_id'], order['shopping_cart']) for order in orders] == [
+            (order_id, [product_id, product_id])]
+        assert orders[0]['items'] == [{'product_id': product_id, 'quantity': 2, 'unit_price': 10}]
+
+        # Заказы удалённых товаров продавцу не показываются
+        await session.execute(update(Product).where(Product.id == product_id).values(is_deleted=True))
+        await session.commit()
+        assert await OrderBusinessDB.get_active_orders(session=session, business_id=business_id) == []
@@ -0,0 +1,66 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from argon2 import PasswordHasher
+from sqlalchemy import event
+
+from backend.src.auth.db import UsersDB
+from backend.src.auth.models import SignInScheme, SignUpScheme
+from backend.src.auth.utils import HashPool, HashPoolBusy, HashSecurity
+from backend.src.db_core.helper import db_helper
+from backend.src.global_config import settings
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_hash_pool_backpressure():
+    pool = HashPool(workers=1, max_pending=1, acquire_timeout=0.05)
+    slow = asyncio.create_task(pool.run(time.sleep, 0.3))
+    await asyncio.sleep(0.01)
+    # Пока поток занят, event loop продолжает отвечать
+    started = time.perf_counter()
+    await asyncio.sleep(0.01)
+    assert time.perf_counter() - started < 0.1
+    with pytest.raises(HashPoolBusy):
+        await pool.run(time.sleep, 0)
+    await slow
+    assert pool.stats()['rejected'] == 1
+    assert pool.stats()['completed'] == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_outdated_hash_needs_rehash():
+    current = await HashSecurity.get_hash('Passw0rd!')
+    outdated = PasswordHasher(
+        time_cost=settings.hashing.TIME_COST + 1,
+        memory_cost=settings.hashing.MEMORY_COST,
+        parallelism=settings.hashing.PARALLELISM).hash('Passw0rd!')
+    assert not await HashSecurity.needs_rehash(current)
+    assert await HashSecurity.needs_rehash(outdated)
+    assert await HashSecurity.verify_hash('Passw0rd!', outdated)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_register_and_sign_in_single_query():
+    creds = SignUpScheme(email=f'{uuid.uuid4().hex[:20]}@auth.com', password='Passw0rd!')
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db_helper.engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        async with db_helper.session_factory() as session:
+            user_id = await UsersDB.register(session=session, creds=creds)
+            registered = len(statements)
+            assert await UsersDB.register(session=session, creds=creds) is None
+            statements.clear()
+            assert await UsersDB.authenticate(
+                session=session, creds=SignInScheme(**creds.model_dump())) == user_id
+            signed_in = len(statements)
+    finally:
+        event.remove(db_helper.engine.sync_engine, "before_cursor_execute", count_statement)
+    assert user_id
+    assert registered == 1
+    assert signed_in == 1
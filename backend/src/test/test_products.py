@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import event
+
+from backend.src.db_core.helper import db_helper
+from backend.src.products.cache import ProductCache, product_cache
+from backend.src.products.db import BusinessDB
+from backend.src.products.models import ProductGetScheme
+from backend.src.products.utils import encode_cursor, decode_cursor, iter_import_rows
+
+from .test_checkout import create_business, create_product
+
+
+async def create_products(count: int) -> list:
+    # Свои товары и пустой кэш: иначе результат зависит от содержимого базы и кэша
+    product_cache.clear()
+    async with db_helper.session_factory() as session:
+        business_id = await create_business(session)
+        return [await create_product(session, business_id) for _ in range(count)]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_products_query_count():
+    ids = await create_products(3)
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db_helper.engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        async with db_helper.session_factory() as session:
+            products = await BusinessDB.get_products(ids=ids + [0], session=session)
+    finally:
+        event.remove(db_helper.engine.sync_engine, "before_cursor_execute", count_statement)
+    assert [product.product_id for product in products] == ids
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_products_keeps_order():
+    first, second, third = await create_products(3)
+    async with db_helper.session_factory() as session:
+        # Второй товар уже в кэше: порядок не зависит от того, откуда пришёл товар
+        await BusinessDB.get_products(ids=[second], session=session)
+        products = await BusinessDB.get_products(ids=[third, first, second, first, 0], session=session)
+    assert [product.product_id for product in products] == [third, first, second]
+
+
+def test_cursor_signature():
+    cursor = encode_cursor({'q': 'phone', 'rank': 0.5, 'id': 42})
+    assert decode_cursor(cursor) == {'q': 'phone', 'rank': 0.5, 'id': 42}
+    body, signature = cursor.split('.')
+    forged = encode_cursor({'q': 'phone', 'rank': 0.5, 'id': 1})
+    assert decode_cursor(f"{forged.split('.')[0]}.{signature}") is None
+    assert decode_cursor('garbage') is None
+    assert decode_cursor('abc.é') is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_import_rows_keep_quoted_newlines():
+    data = '\ufeffname,description\r\n"Lamp","Warm\nlight ""2700K"""\r\n'.encode() + b'Bad,\xff\n'
+
+    async def stream():
+        # Куски по 3 байта режут и строки, и многобайтовые символы
+        for i in range(0, len(data), 3):
+            yield data[i:i + 3]
+
+    rows = [row async for row in iter_import_rows(stream(), csv_format=True)]
+    assert rows == [
+        (1, {'name': 'Lamp', 'description': 'Warm\nlight "2700K"'}, None),
+        (2, None, 'Row is not valid UTF-8')]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_import_rows_stray_quote_keeps_following_rows():
+    data = b'name,description\nA"b,desc\nLamp2,ok\nLamp3,ok\n'
+
+    async def stream():
+        yield data
+
+    rows = [row async for row in iter_import_rows(stream(), csv_format=True)]
+    assert rows == [
+        (1, {'name': 'A"b', 'description': 'desc'}, None),
+        (2, {'name': 'Lamp2', 'description': 'ok'}, None),
+        (3, {'name': 'Lamp3', 'description': 'ok'}, None)]
+
+
+def test_product_cache_lru():
+    cache = ProductCache(max_size=2, ttl=60)
+    for id in (1, 2, 3):
+        cache.put(ProductGetScheme(
+            product_id=id, name='product', description='description',
+            category_id=1, price=100, sex='u', adult_only=False,
+            start_date='2025-01-01', quanity=1, creator_id=1))
+    assert cache.get(1) is None
+    assert cache.get(3).product_id == 3
+    cache.invalidate([3])
+    assert cache.get(3) is None
+    assert cache.stats() == {'size': 1, 'max_size': 2, 'hits': 1, 'misses': 2, 'evictions': 1}
@@ -0,0 +1,17 @@
+import time
+
+from backend.src.auth.cache import TokenCache
+
+
+def test_token_cache_expiry_and_eviction():
+    cache = TokenCache(max_size=2)
+    cache.put('expired', 'payload', time.time() - 1)
+    assert cache.get('expired') is None
+    cache.put('a', 'payload-a', time.time() + 60)
+    cache.put('b', 'payload-b', time.time() + 60)
+    assert cache.get('a') == 'payload-a'
+    cache.put('c', 'payload-c', time.time() + 60)
+    assert cache.get('b') is None
+    assert cache.get('c') == 'payload-c'
+    assert 'a' not in cache._payloads
+    assert cache.stats() == {'size': 2, 'max_size': 2, 'hits': 2, 'misses': 2, 'evictions': 1}